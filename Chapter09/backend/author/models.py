@@ -11,3 +11,23 @@ class Author(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class AuthorFollower(models.Model):
+    author = models.ForeignKey(
+        "Author", related_name="followers", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        "auth.User", related_name="followed_authors", on_delete=models.CASCADE
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user} follows {self.author}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["author", "user"], name="unique_author_follower"
+            ),
+        ]
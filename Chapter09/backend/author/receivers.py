@@ -0,0 +1,10 @@
+from django.dispatch import receiver
+
+from blog import signals
+from common.logging_util import log_event
+
+
+@receiver(signals.notify_author)
+def notify_author(sender, blog_id, **kwargs):
+    # Sent by blog.public.publish_blog once a blog is published.
+    log_event("notify_author", {"blog_id": blog_id})
@@ -1,13 +1,14 @@
 from rest_framework import serializers
 
 from author import models
+from common.serializer_util import CompiledRepresentationMixin
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(CompiledRepresentationMixin, serializers.ModelSerializer):
     long_bio = serializers.CharField(source="bio")
     short_bio = serializers.CharField(source="fetch_short_bio")
 
     class Meta:
         model = models.Author
-        fields = "__all__"
-        exclude = ["bio", "user"]
+        # bio is rendered as long_bio.
+        exclude = ["bio"]
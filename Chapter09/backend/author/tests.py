@@ -1,3 +1,25 @@
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
 
-# Create your tests here.
+from author.models import Author
+from author.serializers import AuthorSerializer
+
+
+class AuthorSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Author.objects.create(name="Short", email="short@example.com", bio="Bio")
+        Author.objects.create(name="Long", email="long@example.com", bio="b" * 150)
+
+    def test_same_output_as_drf(self):
+        authors = Author.objects.order_by("id")
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(AuthorSerializer.represent_many(authors)),
+            renderer.render(AuthorSerializer(authors, many=True).data),
+        )
+
+    def test_bio_is_only_rendered_as_long_and_short_bio(self):
+        data = AuthorSerializer(Author.objects.get(name="Long")).data
+        self.assertEqual(set(data), {"id", "name", "email", "long_bio", "short_bio"})
+        self.assertEqual(len(data["short_bio"]), 100)
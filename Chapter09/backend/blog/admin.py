@@ -1,15 +1,137 @@
+import hashlib
+import json
+
+from django.conf import settings
 from django.contrib import admin
 from django.core import paginator
+from django.core.cache import cache
+from django.db import OperationalError
+from django.db import connections
+from django.db import transaction
+from django.db.models import QuerySet
 from django.utils.functional import cached_property
 from django.contrib.admin.models import LogEntry
 
 from blog import models
+from blog import search
+
+# ============================= CUSTOM PAGINATOR ============================= #
+
+
+# Idea referred from
+# https://hakibenita.com/optimizing-the-django-admin-paginator
+class CustomPaginator(paginator.Paginator):
+    """
+    Paginator which never runs an unbounded COUNT(*) on Postgres.
+    Unfiltered querysets use the planner statistics from pg_class, filtered
+    querysets get an exact count under a short statement_timeout and fall back
+    to the planner estimate when that times out. Counts are cached per query.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        cache_key = "admin_count:%s" % hashlib.md5(
+            str(queryset.query).encode()
+        ).hexdigest()
+        count = cache.get(cache_key)
+        if count is not None:
+            return count
+
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            count = super().count
+        elif not queryset.query.where:
+            count = self._table_estimate(connection, queryset)
+            if count is None:
+                count = self._exact_or_plan_estimate(connection, queryset)
+        else:
+            count = self._exact_or_plan_estimate(connection, queryset)
+
+        cache.set(
+            cache_key, count, getattr(settings, "ADMIN_COUNT_CACHE_TTL", 60 * 5)
+        )
+        return count
+
+    def _table_estimate(self, connection, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 for tables which were never vacuumed or analyzed.
+        if not row or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def _exact_or_plan_estimate(self, connection, queryset):
+        timeout = getattr(settings, "ADMIN_COUNT_STATEMENT_TIMEOUT_MS", 50)
+        try:
+            with transaction.atomic(using=queryset.db):
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL statement_timeout = %s", [timeout])
+                return queryset.count()
+        except OperationalError:
+            return self._plan_estimate(connection, queryset)
+
+    def _plan_estimate(self, connection, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
 
 # ================================ BLOG ADMIN ================================ #
 
 
+class WordCountListFilter(admin.SimpleListFilter):
+    title = "length"
+    parameter_name = "length"
+    ranges = {
+        "short": (0, 300),
+        "medium": (300, 1500),
+        "long": (1500, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [
+            ("short", "Short (< 300 words)"),
+            ("medium", "Medium (300 - 1500 words)"),
+            ("long", "Long (1500+ words)"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        low, high = self.ranges[self.value()]
+        queryset = queryset.filter(word_count__gte=low)
+        if high is not None:
+            queryset = queryset.filter(word_count__lt=high)
+        return queryset
+
+
 class BlogAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["title", "word_count", "reading_time", "created_at"]
+    list_filter = [WordCountListFilter]
+    # Blog has millions of rows, never run an unbounded COUNT(*).
+    paginator = CustomPaginator
+    show_full_result_count = False
+    search_fields = ["title"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the GIN indexed search vector instead of a title ILIKE scan, the
+        # search vector only exists on Postgres.
+        if not search_term or connections[queryset.db].vendor != "postgresql":
+            return super().get_search_results(request, queryset, search_term)
+        queryset, _ = search.filter_by_text(queryset, search_term)
+        return queryset, False
 
 
 admin.site.register(models.Blog, BlogAdmin)
@@ -33,7 +155,8 @@ class BlogCustomAdmin(admin.ModelAdmin):
 
 
 class BlogCustom2Admin(admin.ModelAdmin):
-    list_display = ("email", "word_count", "id")
+    list_display = ("title", "word_count", "id")
+    list_filter = [WordCountListFilter]
 
 
 # admin.site.register(models.Blog, BlogCustom2Admin)
@@ -71,6 +194,9 @@ class BlogCustom4Admin(admin.ModelAdmin):
 
 @admin.register(LogEntry)
 class LogEntryAdmin(admin.ModelAdmin):
+    paginator = CustomPaginator
+    show_full_result_count = False
+
     def has_change_permission(self, request, obj=None):
         return False
 
@@ -81,19 +207,12 @@ class LogEntryAdmin(admin.ModelAdmin):
         return False
 
 
-# ============================= CUSTOM PAGINATOR ============================= #
-
-
-# Idea referred from
-# https://hakibenita.com/optimizing-the-django-admin-paginator
-class CustomPaginator(paginator.Paginator):
-    @cached_property
-    def count(self):
-        return 9999999
+# ============================ BLOG CUSTOM 5 ADMIN =========================== #
 
 
 class BlogCustom5Admin(admin.ModelAdmin):
     paginator = CustomPaginator
+    show_full_result_count = False
 
 
 # admin.site.register(models.Blog, BlogCustom5Admin)
@@ -0,0 +1,135 @@
+"""
+Async native versions of the blog read endpoints, served without thread hops
+when the project runs under ASGI (config/asgi.py).
+DRF views are sync only, so these are plain Django async views doing the
+token/session authentication themselves.
+"""
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.http import JsonResponse
+from redis import asyncio as aioredis
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from blog.models import Blog
+from blog.pagination import apaginate_by_cursor
+from blog.pagination import get_page
+from blog.pagination import get_page_size
+from blog.serializers import BlogSerializer
+from common.access_tokens import user_from_access_token
+from common.authentication import CachedTokenAuthentication
+from common.serializer_util import parse_requested_fields
+
+_redis_client = None
+
+
+def get_async_redis():
+    """Returns a lazily created asyncio Redis client for the default cache."""
+    global _redis_client
+    if _redis_client is None:
+        location = settings.CACHES["default"]["LOCATION"]
+        _redis_client = aioredis.Redis.from_url(location)
+    return _redis_client
+
+
+async def authenticate(request):
+    """
+    Returns the user from the `Authorization: Token <key>` or
+    `Authorization: Bearer <access token>` header, or from the session.
+    """
+    auth = request.headers.get("Authorization", "").split()
+    if len(auth) == 2 and auth[0].lower() == "bearer":
+        return user_from_access_token(auth[1])
+    if len(auth) == 2 and auth[0].lower() == "token":
+        # Same in-process and Redis token cache as the DRF views.
+        try:
+            user, _ = await CachedTokenAuthentication().aauthenticate_credentials(
+                auth[1]
+            )
+        except AuthenticationFailed:
+            return None
+        return user
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def unauthorized():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."}, status=401
+    )
+
+
+def serialize_blogs(blogs, fields=None):
+    return BlogSerializer.represent_many(blogs, fields=fields)
+
+
+async def get_blogs_by_author(request):
+    if await authenticate(request) is None:
+        return unauthorized()
+    author_id = request.GET.get("author_id")
+    cache_key = f"async_blogs_by_author:{author_id}"
+    redis_client = get_async_redis()
+
+    cached_response = await redis_client.get(cache_key)
+    if cached_response is not None:
+        return HttpResponse(cached_response, content_type="application/json")
+
+    blogs = Blog.objects.filter(author_id=author_id)
+    blogs = BlogSerializer.setup_eager_loading(blogs)
+    blogs = [blog async for blog in blogs.aiterator(chunk_size=2000)]
+    content = JSONEncoder().encode({"blogs": serialize_blogs(blogs)})
+    await redis_client.set(
+        cache_key, content, ex=getattr(settings, "ASYNC_BLOG_CACHE_TIMEOUT", 60)
+    )
+    return HttpResponse(content, content_type="application/json")
+
+
+async def get_blog_with_pagination(request):
+    if await authenticate(request) is None:
+        return unauthorized()
+    try:
+        page_size = get_page_size(request)
+        fields = parse_requested_fields(request, BlogSerializer)
+        cursor = request.GET.get("cursor")
+        if "page" in request.GET and not cursor:
+            return await get_blog_page(request, page_size, fields)
+        blogs = BlogSerializer.setup_eager_loading(
+            Blog.objects.all(), fields=fields, required=("id", "created_at")
+        )
+        blogs, next_cursor, previous_cursor = await apaginate_by_cursor(
+            blogs, cursor=cursor, page_size=page_size
+        )
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+    return JsonResponse(
+        {
+            "blogs": serialize_blogs(blogs, fields),
+            "next": next_cursor,
+            "previous": previous_cursor,
+        },
+        encoder=JSONEncoder,
+    )
+
+
+async def get_blog_page(request, page_size, fields):
+    # Offset pagination of `?page=`, same response as blog.views.
+    offset = (get_page(request) - 1) * page_size
+    blogs = BlogSerializer.setup_eager_loading(
+        Blog.objects.order_by("created_at", "id"), fields=fields
+    )[offset : offset + page_size]
+    blogs = [blog async for blog in blogs.aiterator(chunk_size=page_size)]
+    return JsonResponse({"blogs": serialize_blogs(blogs, fields)}, encoder=JSONEncoder)
+
+
+async def get_blog_detail(request, blog_id):
+    if await authenticate(request) is None:
+        return unauthorized()
+    try:
+        blog = await BlogSerializer.setup_eager_loading(Blog.objects.all()).aget(
+            id=blog_id
+        )
+    except Blog.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(BlogSerializer(blog).data, encoder=JSONEncoder)
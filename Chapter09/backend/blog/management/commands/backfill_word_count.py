@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max
+from django.db.models import Min
+
+from blog.models import Blog
+
+
+def backfill_range(start_id, end_id, batch_size):
+    """Updates word_count and reading_time of blogs with start_id <= id < end_id."""
+    # Connections inherited from the parent process must not be shared.
+    connections.close_all()
+    updated = 0
+    for batch_start in range(start_id, end_id, batch_size):
+        batch_end = min(batch_start + batch_size, end_id)
+        blogs = list(
+            Blog.objects.filter(id__gte=batch_start, id__lt=batch_end).only(
+                "id", "content", "word_count", "reading_time"
+            )
+        )
+        changed = []
+        for blog in blogs:
+            word_count, reading_time = blog.word_count, blog.reading_time
+            blog.set_word_count()
+            if (word_count, reading_time) != (blog.word_count, blog.reading_time):
+                changed.append(blog)
+        if changed:
+            Blog.objects.bulk_update(changed, ["word_count", "reading_time"])
+        updated += len(changed)
+    connections.close_all()
+    return updated
+
+
+class Command(BaseCommand):
+    help = "Populates word_count and reading_time of existing blogs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Number of blog ids read and updated per query",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Number of processes"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+        bounds = Blog.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+        if bounds["min_id"] is None:
+            self.stdout.write(self.style.SUCCESS("No blogs to backfill"))
+            return
+
+        # Split the id space in chunks of several batches, handed out to workers.
+        chunk = batch_size * 10
+        ranges = [
+            (start, min(start + chunk, bounds["max_id"] + 1), batch_size)
+            for start in range(bounds["min_id"], bounds["max_id"] + 1, chunk)
+        ]
+        start = time.monotonic()
+        updated = 0
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for done, count in enumerate(executor.map(backfill_range, *zip(*ranges))):
+                updated += count
+                self.stdout.write(
+                    f"\rProcessed {done + 1}/{len(ranges)} id ranges, "
+                    f"updated {updated} blogs",
+                    ending="",
+                )
+                self.stdout.flush()
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {updated} blogs in {time.monotonic() - start:.1f}s"
+            )
+        )
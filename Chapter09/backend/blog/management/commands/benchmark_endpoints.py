@@ -0,0 +1,259 @@
+import json
+import math
+import time
+import timeit
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from blog.models import Blog
+from blog.serializers import BlogSerializer
+from blog.tasks import send_email_to_followers
+from common.authentication import get_auth_stats
+from common.models import OutboxEvent
+
+PREFIX = "bench-"
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Routes which return the whole table run `requests // HEAVY_DIVISOR` times.
+HEAVY_DIVISOR = 10
+
+# Routes which need the Postgres full text search, skipped on other databases.
+POSTGRES_ROUTES = {"search", "search-fuzzy"}
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of a non empty list."""
+    values = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def seed_dataset(scale, seed=42, stdout=None):
+    """
+    Creates a deterministic dataset of `scale` blogs (prefixed with `bench-`),
+    replacing a previous benchmark dataset of another size.
+    """
+    if Blog.objects.filter(title__startswith=PREFIX).count() == scale:
+        return
+    call_command(
+        "seed_data",
+        authors=max(10, scale // 100),
+        blogs=scale,
+        tags=200,
+        seed=seed,
+        prefix=PREFIX,
+        clear=True,
+        stdout=stdout,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the read heavy blog routes and the admin changelist in "
+        "process on a seeded dataset. Run it against a scratch database, it "
+        "creates and deletes `bench-` prefixed rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="10k")
+        parser.add_argument(
+            "--requests", type=int, default=50, help="Requests per route"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--skip", nargs="+", default=[], help="Route names not to measure"
+        )
+        parser.add_argument("--baseline", help="Baseline JSON file to compare with")
+        parser.add_argument(
+            "--write-baseline",
+            action="store_true",
+            help="Store the results in the baseline file instead of comparing",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.2,
+            help="p95 latency ratio over the baseline reported as a regression",
+        )
+        parser.add_argument("--output", help="Write the results as JSON here")
+        parser.add_argument(
+            "--serialize",
+            type=int,
+            default=1000,
+            help="Blogs serialized to compare DRF with the compiled representation",
+        )
+
+    def handle(self, *args, **options):
+        scale = SCALES[options["scale"]]
+        seed_dataset(scale, seed=options["seed"], stdout=self.stdout)
+
+        user, _ = User.objects.get_or_create(
+            username=f"{PREFIX}admin",
+            defaults={"is_staff": True, "is_superuser": True},
+        )
+        token, _ = Token.objects.get_or_create(user=user)
+        # API routes authenticate with the token, the admin with the session.
+        client = Client(HTTP_HOST="localhost", HTTP_AUTHORIZATION=f"Token {token.key}")
+        client.force_login(user)
+
+        results = {}
+        outbox_start = OutboxEvent.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        for name, url, heavy in self.get_routes():
+            if name in options["skip"]:
+                continue
+            if name in POSTGRES_ROUTES and connection.vendor != "postgresql":
+                self.stdout.write(f"{name:<26} skipped, needs Postgres")
+                continue
+            requests = options["requests"]
+            if heavy:
+                requests = max(1, requests // HEAVY_DIVISOR)
+            results[name] = self.measure(client, url, requests)
+            self.stdout.write(self.format_row(name, results[name]))
+        self.stdout.write(f"Token authentication: {get_auth_stats()}")
+        if options["serialize"]:
+            self.stdout.write(self.measure_serialization(options["serialize"]))
+        # Drop the publish events created by the benchmark.
+        OutboxEvent.objects.filter(
+            id__gt=outbox_start, task_name=send_email_to_followers.name
+        ).delete()
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump({options["scale"]: results}, file, indent=2)
+        if options["baseline"]:
+            self.handle_baseline(options, results)
+
+    def get_routes(self):
+        blogs = Blog.objects.filter(title__startswith=PREFIX)
+        blog = blogs.order_by("id")[blogs.count() // 2]
+        by_author = f"find-by-author/?author_id={blog.author_id}"
+        return [
+            ("find-by-author", f"/blog/{by_author}", False),
+            ("perm-check", f"/blog/perm-check/?id={blog.id}", False),
+            ("paginated", "/blog/paginated/?page=50&page_size=10", False),
+            ("paginated-deep", "/blog/paginated/?page=1000&page_size=10", False),
+            ("paginated-cursor", "/blog/paginated/?mode=cursor&page_size=10", False),
+            ("paginated-fields", "/blog/paginated/?page=50&fields=id,title", False),
+            ("search", "/blog/search/?q=postgres+cache", False),
+            ("search-fuzzy", "/blog/search/?q=bench-12&fuzzy=1", False),
+            ("async-find-by-author", f"/blog/async/{by_author}", False),
+            ("async-paginated", "/blog/async/paginated/?page_size=10", False),
+            ("async-detail", f"/blog/async/{blog.id}/", False),
+            ("unpaginated", "/blog/unpaginated/", True),
+            ("unpaginated-stream", "/blog/unpaginated/?stream=json", True),
+            ("admin-changelist", "/admin/blog/blog/", False),
+            ("admin-changelist-search", "/admin/blog/blog/?q=postgres", False),
+            # Only writes an outbox row, see common.outbox.
+            (
+                "publish",
+                f"/blog/publish/?blog_id={blog.id}&author_id={blog.author_id}",
+                False,
+            ),
+            # verify/ is not measured, it needs a running Celery broker.
+        ]
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(f"{url} returned {response.status_code}")
+        return response
+
+    def measure(self, client, url, requests):
+        # Warm up caches and lazy imports before measuring.
+        self.request(client, url)
+
+        latencies, queries, db_times = [], [], []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                self.request(client, url)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+            db_time = sum(float(query["time"]) for query in context.captured_queries)
+            db_times.append(db_time * 1000)
+
+        # Measured separately, tracing allocations slows the requests down.
+        tracemalloc.start()
+        self.request(client, url)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "requests": requests,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "queries": max(queries),
+            "db_ms": round(sum(db_times) / len(db_times), 2),
+            "peak_memory_kb": round(peak_memory / 1024),
+        }
+
+    def measure_serialization(self, count):
+        blogs = Blog.objects.filter(title__startswith=PREFIX).order_by("id")
+        blogs = list(BlogSerializer.setup_eager_loading(blogs)[:count])
+
+        def rows_per_second(func):
+            return len(blogs) / min(timeit.repeat(func, number=1, repeat=5))
+
+        drf = rows_per_second(lambda: BlogSerializer(blogs, many=True).data)
+        compiled = rows_per_second(lambda: BlogSerializer.represent_many(blogs))
+        return (
+            f"Serialization of {len(blogs)} blogs: DRF {drf:,.0f} rows/s, "
+            f"compiled {compiled:,.0f} rows/s ({compiled / drf:.1f}x)"
+        )
+
+    def format_row(self, name, result):
+        return (
+            f"{name:<26} "
+            f"p50 {result['p50_ms']:>9.2f}ms  "
+            f"p95 {result['p95_ms']:>9.2f}ms  "
+            f"p99 {result['p99_ms']:>9.2f}ms  "
+            f"queries {result['queries']:>4}  "
+            f"db {result['db_ms']:>8.2f}ms  "
+            f"peak {result['peak_memory_kb']:>8}KB"
+        )
+
+    def handle_baseline(self, options, results):
+        path, scale = options["baseline"], options["scale"]
+        try:
+            with open(path) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            baseline = {}
+
+        if options["write_baseline"]:
+            baseline[scale] = results
+            with open(path, "w") as file:
+                json.dump(baseline, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}"))
+            return
+
+        if scale not in baseline:
+            raise CommandError(f"No {scale} baseline in {path}, use --write-baseline")
+        regressions = []
+        for name, result in results.items():
+            base = baseline[scale].get(name)
+            if base is None:
+                continue
+            if result["p95_ms"] > base["p95_ms"] * options["threshold"]:
+                regressions.append(
+                    f"{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms"
+                )
+            if result["queries"] > base["queries"]:
+                regressions.append(
+                    f"{name}: queries {base['queries']} -> {result['queries']}"
+                )
+        if regressions:
+            raise CommandError("Regressions found:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
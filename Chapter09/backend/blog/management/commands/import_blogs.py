@@ -0,0 +1,261 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import transaction
+from django.utils import timezone
+
+from author.models import Author
+from blog.models import Blog
+from blog.models import CoverImage
+from blog.models import Tag
+from blog.models import count_words
+from blog.models import estimate_reading_time
+from common.bulk_util import copy_rows
+from common.bulk_util import reserve_ids
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file):
+    for row in csv.DictReader(file):
+        row["tags"] = [tag for tag in row.get("tags", "").split(";") if tag]
+        yield row
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports blogs from a JSONL or CSV file. Every record needs title, content, "
+        "author_email and cover_image, tags is an optional list (';' separated in CSV)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL or CSV file to import")
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="Input format, guessed from the file extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of blogs inserted per transaction",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File keeping the number of imported records "
+            "(default: <path>.checkpoint)",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk_create even when the database is Postgres",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"] or (
+            "csv" if path.endswith(".csv") else "jsonl"
+        )
+        batch_size = options["batch_size"]
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+
+        done = self.read_checkpoint(checkpoint_path)
+        if done:
+            self.stdout.write(f"Resuming after {done} records")
+
+        reader = read_csv if input_format == "csv" else read_jsonl
+        imported = skipped = 0
+        start = time.monotonic()
+        with open(path, newline="", encoding="utf-8") as file:
+            records = itertools.islice(reader(file), done, None)
+            while True:
+                batch = list(itertools.islice(records, batch_size))
+                if not batch:
+                    break
+                try:
+                    with transaction.atomic():
+                        count = self.import_batch(batch, use_copy)
+                except KeyError as e:
+                    raise CommandError(
+                        f"Record between {done} and {done + len(batch)} misses {e}"
+                    )
+                imported += count
+                skipped += len(batch) - count
+                done += len(batch)
+                self.write_checkpoint(checkpoint_path, done)
+
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f"\rImported {imported} blogs, skipped {skipped} "
+                    f"({imported / elapsed:.0f} blogs/sec)",
+                    ending="",
+                )
+                self.stdout.flush()
+
+        self.stdout.write("")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} blogs, skipped {skipped}")
+        )
+
+    def read_checkpoint(self, checkpoint_path):
+        if not os.path.exists(checkpoint_path):
+            return 0
+        with open(checkpoint_path) as file:
+            return int(file.read().strip() or 0)
+
+    def write_checkpoint(self, checkpoint_path, done):
+        # Written after the batch is committed, a crash re-reads at most one
+        # batch, whose blogs are skipped as they already exist.
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(str(done))
+        os.replace(tmp_path, checkpoint_path)
+
+    def drop_existing(self, batch):
+        """
+        Drops the records whose title is already imported or repeats a title of
+        the batch, titles are unique.
+        """
+        titles = {record["title"] for record in batch}
+        seen = set(
+            Blog.objects.filter(title__in=titles).values_list("title", flat=True)
+        )
+        records = []
+        for record in batch:
+            if record["title"] not in seen:
+                seen.add(record["title"])
+                records.append(record)
+        return records
+
+    def resolve_authors(self, batch):
+        emails = {record["author_email"] for record in batch}
+        return dict(
+            Author.objects.filter(email__in=emails).values_list("email", "id")
+        )
+
+    def resolve_tags(self, batch):
+        names = {name for record in batch for name in record.get("tags") or []}
+        if not names:
+            return {}
+        tags = dict(Tag.objects.filter(name__in=names).values_list("name", "id"))
+        missing = names - tags.keys()
+        if missing:
+            Tag.objects.bulk_create(
+                [Tag(name=name) for name in missing], ignore_conflicts=True
+            )
+            tags.update(
+                Tag.objects.filter(name__in=missing).values_list("name", "id")
+            )
+        return tags
+
+    def import_batch(self, batch, use_copy):
+        """Imports one batch of records, returns the number of imported blogs."""
+        batch = self.drop_existing(batch)
+        if not batch:
+            return 0
+        authors = self.resolve_authors(batch)
+        batch = [record for record in batch if record["author_email"] in authors]
+        if not batch:
+            return 0
+        tags = self.resolve_tags(batch)
+        if use_copy:
+            self.copy_batch(batch, authors, tags)
+        else:
+            self.bulk_create_batch(batch, authors, tags)
+        return len(batch)
+
+    def bulk_create_batch(self, batch, authors, tags):
+        cover_images = CoverImage.objects.bulk_create(
+            [CoverImage(image_link=record["cover_image"]) for record in batch]
+        )
+        blogs = Blog.objects.bulk_create(
+            [
+                Blog(
+                    title=record["title"],
+                    content=record["content"],
+                    author_id=authors[record["author_email"]],
+                    cover_image_id=cover_image.id,
+                )
+                for record, cover_image in zip(batch, cover_images)
+            ]
+        )
+        Blog.tags.through.objects.bulk_create(
+            [
+                Blog.tags.through(blog_id=blog.id, tag_id=tags[name])
+                for record, blog in zip(batch, blogs)
+                for name in set(record.get("tags") or [])
+            ]
+        )
+
+    def copy_batch(self, batch, authors, tags):
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cover_image_ids = reserve_ids(cursor, CoverImage, len(batch))
+            blog_ids = reserve_ids(cursor, Blog, len(batch))
+            copy_rows(
+                cursor,
+                CoverImage,
+                ["id", "image_link", "created_at", "updated_at"],
+                (
+                    (cover_image_id, record["cover_image"], now, now)
+                    for record, cover_image_id in zip(batch, cover_image_ids)
+                ),
+            )
+            copy_rows(
+                cursor,
+                Blog,
+                [
+                    "id",
+                    "title",
+                    "content",
+                    "author_id",
+                    "cover_image_id",
+                    "created_at",
+                    "updated_at",
+                    "word_count",
+                    "reading_time",
+                ],
+                (
+                    (
+                        blog_id,
+                        record["title"],
+                        record["content"],
+                        authors[record["author_email"]],
+                        cover_image_id,
+                        now,
+                        now,
+                        word_count,
+                        estimate_reading_time(word_count),
+                    )
+                    for record, blog_id, cover_image_id, word_count in zip(
+                        batch,
+                        blog_ids,
+                        cover_image_ids,
+                        (count_words(record["content"]) for record in batch),
+                    )
+                ),
+            )
+            copy_rows(
+                cursor,
+                Blog.tags.through,
+                ["blog_id", "tag_id"],
+                (
+                    (blog_id, tags[name])
+                    for record, blog_id in zip(batch, blog_ids)
+                    for name in set(record.get("tags") or [])
+                ),
+            )
@@ -0,0 +1,368 @@
+import bisect
+import datetime
+import itertools
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+from django.utils import timezone
+
+from author.models import Author
+from blog.models import Blog
+from blog.models import CoverImage
+from blog.models import Tag
+from blog.models import estimate_reading_time
+from common.bulk_util import copy_rows
+from common.bulk_util import reserve_ids
+
+WORDS = (
+    "django production database query cache index latency throughput worker "
+    "request response serializer model migration redis celery postgres blog "
+    "author tag cover image admin token session deploy scale memory the a of "
+    "and to in is it for on with as this that by from at be are was or an "
+    "not can will your you we our how what when why which more most new first "
+    "time data code test build release server client view url route field "
+    "table row column transaction lock replica backup monitor alert metric log"
+).split()
+
+# Blogs are generated in jobs of JOB_SIZE rows, every job has its own random
+# generator so the data only depends on the seed, not on --workers.
+JOB_SIZE = 50_000
+# Content length in words is log-normal, median ~600 words with a long tail.
+CONTENT_WORDS_MU = 6.4
+CONTENT_WORDS_SIGMA = 0.7
+CONTENT_WORDS_RANGE = (20, 10_000)
+MAX_TAGS_PER_BLOG = 8
+# created_at is spread over the 3 years before this date (COPY only, bulk_create
+# goes through auto_now_add).
+CREATED_UNTIL = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+CREATED_SPAN_SECONDS = 3 * 365 * 24 * 60 * 60
+
+
+def build_vocabulary(rng, size=5000):
+    """Returns real words followed by a long tail of pronounceable made up words."""
+    syllables = [c + v for c in "bcdfghjklmnprstvwz" for v in "aeiou"]
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choices(syllables, k=rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative Zipf weights, the item of rank k is picked with weight 1 / k**s."""
+    weights = (1 / rank**exponent for rank in range(1, count + 1))
+    return list(itertools.accumulate(weights))
+
+
+def build_corpus(seed, size=200_000):
+    """Returns a list of words with a Zipf word frequency, content is sliced from it."""
+    rng = random.Random(f"{seed}:corpus")
+    vocabulary = build_vocabulary(rng)
+    cum_weights = zipf_cum_weights(len(vocabulary), 1.0)
+    return rng.choices(vocabulary, cum_weights=cum_weights, k=size)
+
+
+SeedBlog = namedtuple(
+    "SeedBlog", "index title content word_count author_id tag_ids created_at"
+)
+
+_worker = {}
+
+
+def init_worker(
+    seed, prefix, use_copy, batch_size, author_ids=(), tag_ids=(), zipf=1.1
+):
+    # Connections inherited from the parent process must not be shared.
+    connections.close_all()
+    _worker.update(
+        seed=seed,
+        prefix=prefix,
+        use_copy=use_copy,
+        batch_size=batch_size,
+        corpus=build_corpus(seed),
+        author_ids=author_ids,
+        tag_ids=tag_ids,
+        tag_cum_weights=zipf_cum_weights(len(tag_ids), zipf),
+    )
+
+
+def batches(start, count, batch_size):
+    for batch_start in range(start, start + count, batch_size):
+        yield range(batch_start, min(batch_start + batch_size, start + count))
+
+
+def create_authors(start, count):
+    """Creates the authors with index start <= i < start + count."""
+    seed, prefix, corpus = _worker["seed"], _worker["prefix"], _worker["corpus"]
+    rng = random.Random(f"{seed}:authors:{start}")
+    for indexes in batches(start, count, _worker["batch_size"]):
+        rows = []
+        for i in indexes:
+            bio_words = rng.randint(10, 80)
+            offset = rng.randrange(len(corpus) - bio_words)
+            rows.append(
+                (
+                    f"Author {i}",
+                    f"{prefix}author-{i}@example.com",
+                    " ".join(corpus[offset : offset + bio_words]),
+                )
+            )
+        with transaction.atomic():
+            if _worker["use_copy"]:
+                with connection.cursor() as cursor:
+                    copy_rows(cursor, Author, ["name", "email", "bio"], rows)
+            else:
+                Author.objects.bulk_create(
+                    Author(name=name, email=email, bio=bio)
+                    for name, email, bio in rows
+                )
+    return count
+
+
+def generate_blog(rng, i):
+    corpus, prefix = _worker["corpus"], _worker["prefix"]
+    low, high = CONTENT_WORDS_RANGE
+    word_count = int(rng.lognormvariate(CONTENT_WORDS_MU, CONTENT_WORDS_SIGMA))
+    word_count = min(max(word_count, low), high)
+    offset = rng.randrange(len(corpus) - word_count)
+    content = " ".join(corpus[offset : offset + word_count])
+    title = f"{prefix}{i} {' '.join(corpus[offset : offset + 8])}"[:100]
+
+    tag_ids = _worker["tag_ids"]
+    tags = set()
+    if tag_ids:
+        cum_weights = _worker["tag_cum_weights"]
+        for _ in range(rng.randint(0, MAX_TAGS_PER_BLOG)):
+            rank = bisect.bisect(cum_weights, rng.random() * cum_weights[-1])
+            tags.add(tag_ids[min(rank, len(tag_ids) - 1)])
+    created_at = CREATED_UNTIL - datetime.timedelta(
+        seconds=rng.randrange(CREATED_SPAN_SECONDS)
+    )
+    author_id = _worker["author_ids"][rng.randrange(len(_worker["author_ids"]))]
+    return SeedBlog(i, title, content, word_count, author_id, tags, created_at)
+
+
+def create_blogs(start, count):
+    """Creates the blogs with index start <= i < start + count."""
+    rng = random.Random(f"{_worker['seed']}:blogs:{start}")
+    for indexes in batches(start, count, _worker["batch_size"]):
+        blogs = [generate_blog(rng, i) for i in indexes]
+        with transaction.atomic():
+            if _worker["use_copy"]:
+                copy_blogs(blogs)
+            else:
+                bulk_create_blogs(blogs)
+    return count
+
+
+def cover_image_link(i):
+    return f"https://example.com/covers/{_worker['prefix']}{i}.jpg"
+
+
+def copy_blogs(blogs):
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cover_image_ids = reserve_ids(cursor, CoverImage, len(blogs))
+        blog_ids = reserve_ids(cursor, Blog, len(blogs))
+        copy_rows(
+            cursor,
+            CoverImage,
+            ["id", "image_link", "created_at", "updated_at"],
+            (
+                (cover_image_id, cover_image_link(blog.index), now, now)
+                for blog, cover_image_id in zip(blogs, cover_image_ids)
+            ),
+        )
+        copy_rows(
+            cursor,
+            Blog,
+            [
+                "id",
+                "title",
+                "content",
+                "author_id",
+                "cover_image_id",
+                "created_at",
+                "updated_at",
+                "word_count",
+                "reading_time",
+            ],
+            (
+                (
+                    blog_id,
+                    blog.title,
+                    blog.content,
+                    blog.author_id,
+                    cover_image_id,
+                    blog.created_at,
+                    blog.created_at,
+                    blog.word_count,
+                    estimate_reading_time(blog.word_count),
+                )
+                for blog, blog_id, cover_image_id in zip(
+                    blogs, blog_ids, cover_image_ids
+                )
+            ),
+        )
+        copy_rows(
+            cursor,
+            Blog.tags.through,
+            ["blog_id", "tag_id"],
+            (
+                (blog_id, tag_id)
+                for blog, blog_id in zip(blogs, blog_ids)
+                for tag_id in blog.tag_ids
+            ),
+        )
+
+
+def bulk_create_blogs(blogs):
+    cover_images = CoverImage.objects.bulk_create(
+        [CoverImage(image_link=cover_image_link(blog.index)) for blog in blogs]
+    )
+    created = Blog.objects.bulk_create(
+        [
+            Blog(
+                title=blog.title,
+                content=blog.content,
+                author_id=blog.author_id,
+                cover_image_id=cover_image.id,
+            )
+            for blog, cover_image in zip(blogs, cover_images)
+        ]
+    )
+    Blog.tags.through.objects.bulk_create(
+        [
+            Blog.tags.through(blog_id=created_blog.id, tag_id=tag_id)
+            for blog, created_blog in zip(blogs, created)
+            for tag_id in blog.tag_ids
+        ]
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic authors, tags and blogs for load and scale testing. "
+        "The same --seed and counts always generate the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=1000)
+        parser.add_argument("--blogs", type=int, default=100_000)
+        parser.add_argument("--tags", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Exponent of the Zipf distribution of the tags",
+        )
+        parser.add_argument(
+            "--prefix",
+            default="seed-",
+            help="Prefix of the generated titles, author emails and tag names",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows inserted per transaction",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Number of processes"
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk_create even when the database is Postgres",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete the previously generated data with the same prefix first",
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if options["authors"] < 1:
+            raise CommandError("--authors must be at least 1")
+        if options["clear"]:
+            self.clear(prefix)
+        elif Author.objects.filter(email__startswith=prefix).exists():
+            raise CommandError(f"Data prefixed with {prefix!r} exists, use --clear")
+
+        use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+        init_args = (options["seed"], prefix, use_copy, options["batch_size"])
+        start = time.monotonic()
+
+        self.run_jobs("authors", create_authors, options["authors"], options, init_args)
+        # Looked up by index, the workers insert the authors in any order.
+        authors = Author.objects.filter(email__startswith=prefix)
+        ids = dict(authors.values_list("email", "id"))
+        author_ids = [
+            ids[f"{prefix}author-{i}@example.com"] for i in range(options["authors"])
+        ]
+        tag_ids = self.create_tags(prefix, options["tags"])
+        self.run_jobs(
+            "blogs",
+            create_blogs,
+            options["blogs"],
+            options,
+            (*init_args, author_ids, tag_ids, options["zipf"]),
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {options['authors']} authors, {options['tags']} tags and "
+                f"{options['blogs']} blogs in {time.monotonic() - start:.1f}s"
+            )
+        )
+
+    def clear(self, prefix):
+        # Deleting the cover images cascades to the blogs and their tags.
+        CoverImage.objects.filter(image_link__contains=f"/{prefix}").delete()
+        Author.objects.filter(email__startswith=prefix).delete()
+        Tag.objects.filter(name__startswith=prefix).delete()
+
+    def create_tags(self, prefix, count):
+        """Creates the tags, returns their ids ordered by Zipf rank."""
+        names = [f"{prefix}tag-{i}" for i in range(count)]
+        Tag.objects.bulk_create([Tag(name=name) for name in names], batch_size=5000)
+        tags = Tag.objects.filter(name__startswith=prefix)
+        ids = dict(tags.values_list("name", "id"))
+        return [ids[name] for name in names]
+
+    def run_jobs(self, name, func, total, options, init_args):
+        jobs = [
+            (job_start, min(JOB_SIZE, total - job_start))
+            for job_start in range(0, total, JOB_SIZE)
+        ]
+        if not jobs:
+            return
+        started = time.monotonic()
+        done = 0
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=init_worker, initargs=init_args
+        ) as executor:
+            for count in executor.map(func, *zip(*jobs)):
+                done += count
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"\rGenerated {done}/{total} {name} "
+                    f"({done / elapsed:.0f} rows/sec)",
+                    ending="",
+                )
+                self.stdout.flush()
+        self.stdout.write("")
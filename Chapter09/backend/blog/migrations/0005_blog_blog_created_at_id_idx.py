@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_alter_blog_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['created_at', 'id'], name='blog_created_at_id_idx'),
+        ),
+    ]
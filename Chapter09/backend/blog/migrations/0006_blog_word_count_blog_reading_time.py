@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_blog_blog_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='word_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='reading_time',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Estimated reading time in minutes'),
+        ),
+    ]
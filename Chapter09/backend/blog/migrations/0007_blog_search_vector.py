@@ -0,0 +1,81 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:00
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+ALTER TABLE blog_blog ADD COLUMN search_vector tsvector;
+
+CREATE FUNCTION blog_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER blog_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON blog_blog
+    FOR EACH ROW EXECUTE FUNCTION blog_search_vector_update();
+
+UPDATE blog_blog SET search_vector =
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B');
+
+CREATE INDEX blog_search_vector_idx ON blog_blog USING GIN (search_vector);
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP TRIGGER blog_search_vector_trigger ON blog_blog;
+DROP FUNCTION blog_search_vector_update();
+ALTER TABLE blog_blog DROP COLUMN search_vector;
+"""
+
+TITLE_TRGM_INDEX = GinIndex(
+    fields=['title'], name='blog_title_trgm_idx', opclasses=['gin_trgm_ops']
+)
+
+
+# search_vector and the trigram index only exist on Postgres, the other
+# databases (SQLite in tests) keep the model state without them.
+def create_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+def add_title_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('blog', 'Blog'), TITLE_TRGM_INDEX)
+
+
+def remove_title_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('blog', 'Blog'), TITLE_TRGM_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_blog_word_count_blog_reading_time'),
+    ]
+
+    operations = [
+        # search_vector is not a model field, see blog/search.py
+        migrations.RunPython(create_search_vector, drop_search_vector),
+        TrigramExtension(),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='blog', index=TITLE_TRGM_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(add_title_trgm_index, remove_title_trgm_index),
+            ],
+        ),
+    ]
@@ -1,4 +1,43 @@
+import math
+
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+WORDS_PER_MINUTE = 200
+
+
+def count_words(content):
+    return len(content.split())
+
+
+def estimate_reading_time(word_count):
+    """Returns the reading time in minutes, at least 1 for any content."""
+    return max(1, math.ceil(word_count / WORDS_PER_MINUTE)) if word_count else 0
+
+
+class BlogQuerySet(models.QuerySet):
+    """
+    Keeps `word_count` and `reading_time` in sync on the bulk paths which do not
+    call `Blog.save`. `QuerySet.update(content=...)` is not covered, use
+    `bulk_update` or the `backfill_word_count` command after such updates.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_word_count()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if "content" in fields:
+            for obj in objs:
+                obj.set_word_count()
+            fields = list({*fields, "word_count", "reading_time"})
+        return super().bulk_update(objs, fields, *args, **kwargs)
 
 
 class Blog(models.Model):
@@ -13,15 +52,51 @@ class Blog(models.Model):
         "CoverImage", related_name="blog_cover_image", on_delete=models.CASCADE
     )
     tags = models.ManyToManyField("Tag", related_name="blog_tags")
+    # Derived from content on every write, so serializers never split the content.
+    word_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True
+    )
+    reading_time = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Estimated reading time in minutes"
+    )
+
+    objects = BlogQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    def set_word_count(self):
+        self.word_count = count_words(self.content)
+        self.reading_time = estimate_reading_time(self.word_count)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        # A deferred content would be loaded by set_word_count just to count it.
+        if update_fields is None or "content" in update_fields:
+            self.set_word_count()
+        if update_fields:
+            # auto_now is only written when listed, collection ETags rely on it.
+            update_fields = {*update_fields, "updated_at"}
+            if "content" in update_fields:
+                update_fields |= {"word_count", "reading_time"}
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
     class Meta:
         permissions = [
             ("update_title", "Can update the title of the blog"),
             ("update_content", "Can update the content of blog"),
         ]
+        indexes = [
+            # Keyset pagination orders on (created_at, id), keep it an index range scan.
+            models.Index(fields=["created_at", "id"], name="blog_created_at_id_idx"),
+            # Fuzzy title search, see blog.search.search_blogs.
+            GinIndex(
+                fields=["title"],
+                name="blog_title_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
 
 class BaseTimeStampModel(models.Model):
@@ -38,3 +113,22 @@ class CoverImage(BaseTimeStampModel):
 
 class Tag(BaseTimeStampModel):
     name = models.CharField(max_length=100, unique=True)
+
+
+@receiver(m2m_changed, sender=Blog.tags.through)
+def touch_tagged_blogs(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Tags are part of a blog's representation, bump `updated_at` so the
+    collection ETags of `common.conditional_util` change with them.
+    """
+    if action in ("post_add", "post_remove"):
+        blog_ids = pk_set if reverse else [instance.pk]
+    elif action == "post_clear" and not reverse:
+        blog_ids = [instance.pk]
+    elif action == "pre_clear" and reverse:
+        # tag.blog_tags.clear(), the blogs are unknown once cleared.
+        blog_ids = list(instance.blog_tags.values_list("id", flat=True))
+    else:
+        return
+    if blog_ids:
+        Blog.objects.filter(pk__in=blog_ids).update(updated_at=timezone.now())
@@ -0,0 +1,47 @@
+"""
+Postgres full text search over blog title and content.
+`blog_blog.search_vector` is maintained by a trigger (see migration 0007) and
+is deliberately not a model field, so regular blog queries never fetch it.
+"""
+
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from blog.models import Blog
+
+SEARCH_CONFIG = "english"
+
+
+def search_vector():
+    return RawSQL(
+        f'"{Blog._meta.db_table}"."search_vector"',
+        [],
+        output_field=SearchVectorField(),
+    )
+
+
+def filter_by_text(queryset, text):
+    """Filters the queryset with the GIN indexed search vector."""
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    return queryset.alias(search=search_vector()).filter(search=query), query
+
+
+def search_blogs(queryset, text, fuzzy=False):
+    """
+    Returns the blogs matching `text`, best matches first.
+    :param fuzzy: Match titles by trigram similarity instead, tolerates typos
+    """
+    if fuzzy:
+        return (
+            queryset.annotate(similarity=TrigramSimilarity("title", text))
+            .filter(title__trigram_similar=text)
+            .order_by("-similarity", "-id")
+        )
+    queryset, query = filter_by_text(queryset, text)
+    return queryset.annotate(rank=SearchRank(F("search"), query)).order_by(
+        "-rank", "-id"
+    )
@@ -3,9 +3,13 @@ from rest_framework import validators
 
 from blog import models
 from author import models as author_models
+from common.serializer_util import CompiledRepresentationMixin
+from common.serializer_util import EagerLoadingMixin
 
 
-class BlogSerializer(serializers.ModelSerializer):
+class BlogSerializer(
+    EagerLoadingMixin, CompiledRepresentationMixin, serializers.ModelSerializer
+):
     class Meta:
         model = models.Blog
         fields = "__all__"
@@ -42,7 +46,7 @@ class BlogCustom3Serializer(serializers.ModelSerializer):
         queryset=author_models.Author.objects.all()
     )
     tags = serializers.PrimaryKeyRelatedField(
-        queryset=models.Tags.objects.all(), many=True, allow_empty=True
+        queryset=models.Tag.objects.all(), many=True, allow_empty=True
     )
     cover_image = serializers.PrimaryKeyRelatedField(
         queryset=models.CoverImage.objects.all(),
@@ -63,7 +67,7 @@ class BASerializer(serializers.ModelSerializer):
         fields = ["name", "bio"]
 
 
-class BlogCustom4Serializer(serializers.ModelSerializer):
+class BlogCustom4Serializer(EagerLoadingMixin, serializers.ModelSerializer):
     author_details = BASerializer(source="author")
 
     class Meta:
@@ -78,7 +82,7 @@ class BlogCustom5Serializer(serializers.ModelSerializer):
     word_count = serializers.SerializerMethodField()
 
     def get_word_count(self, obj):
-        return len(obj.content.split())
+        return obj.word_count
 
     class Meta:
         model = models.Blog
@@ -92,7 +96,7 @@ class BlogCustom6CustomSerializer(serializers.ModelSerializer):
     word_count = serializers.SerializerMethodField(method_name="use_custom_word_count")
 
     def use_custom_word_count(self, obj):
-        return len(obj.content.split())
+        return obj.word_count
 
     class Meta:
         model = models.Blog
@@ -255,7 +259,7 @@ class CustomPKRelatedField(serializers.PrimaryKeyRelatedField):
 
 
 class BlogCustom16Serialzier(serializers.ModelSerializer):
-    tags = CustomPKRelatedField(queryset=models.Tags.objects.all())
+    tags = CustomPKRelatedField(queryset=models.Tag.objects.all())
 
     class Meta:
         model = models.Blog
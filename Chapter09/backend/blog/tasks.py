@@ -1,6 +1,117 @@
+import math
+
+from celery import group
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+
+from author.models import AuthorFollower
+from blog.models import Blog
+from common.throttling import get_gcra_script
 from config.celery import task
 
+FANOUT_PROGRESS_TIMEOUT = 60 * 60 * 24
+SENT_MARKER_TIMEOUT = 60 * 60 * 24
+
+
+def _progress_key(blog_id, name):
+    return f"follower_fanout:{blog_id}:{name}"
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, FANOUT_PROGRESS_TIMEOUT)
+    return cache.incr(key, delta)
+
+
+def get_fanout_progress(blog_id):
+    """Returns the progress counters of the follower emails of a blog."""
+    names = ["batches_total", "batches_done", "emails_sent", "dispatch_done"]
+    values = cache.get_many([_progress_key(blog_id, name) for name in names])
+    return {name: values.get(_progress_key(blog_id, name), 0) for name in names}
+
+
+@task(bind=True, max_retries=5, default_retry_delay=30)
+def send_email_to_followers(self, author_id, blog_id, after_id=0):
+    """
+    Coordinator of the follower emails of a published blog. Pages through the
+    followers by keyset and dispatches one `send_blog_email_batch` per page, it
+    re-enqueues itself after `FOLLOWER_FANOUT_PAGES_PER_RUN` pages so a single
+    run stays short and a retry only repeats one run.
+    """
+    batch_size = getattr(settings, "FOLLOWER_EMAIL_BATCH_SIZE", 500)
+    pages_per_run = getattr(settings, "FOLLOWER_FANOUT_PAGES_PER_RUN", 100)
+    followers = AuthorFollower.objects.filter(author_id=author_id).order_by("id")
+
+    batches = []
+    has_more = False
+    for _ in range(pages_per_run):
+        page = followers.filter(id__gt=after_id).values_list("id", flat=True)
+        follower_ids = list(page[:batch_size])
+        if not follower_ids:
+            break
+        batches.append(send_blog_email_batch.s(author_id, blog_id, follower_ids))
+        after_id = follower_ids[-1]
+        has_more = len(follower_ids) == batch_size
+        if not has_more:
+            break
+
+    if batches:
+        _incr(_progress_key(blog_id, "batches_total"), len(batches))
+        group(batches).apply_async()
+    if has_more:
+        # Continue from the last dispatched follower in a new run.
+        send_email_to_followers.delay(author_id, blog_id, after_id=after_id)
+    else:
+        cache.set(_progress_key(blog_id, "dispatch_done"), 1, FANOUT_PROGRESS_TIMEOUT)
+
+
+@task(bind=True, max_retries=5, default_retry_delay=30)
+def send_blog_email_batch(self, author_id, blog_id, follower_ids):
+    """
+    Sends the blog email to one batch of followers over a single SMTP
+    connection. Every recipient is marked as sent so a retried batch skips the
+    emails which already went out.
+    """
+    # Per author rate limit shared by all workers, see common.throttling.
+    per_minute = getattr(settings, "FOLLOWER_EMAIL_BATCHES_PER_MINUTE", 60)
+    allowed, wait_ms = get_gcra_script()(
+        keys=[f"follower_fanout_rate:{author_id}"],
+        args=[math.ceil(60 * 1000 / per_minute), per_minute],
+    )
+    if not allowed:
+        raise self.retry(countdown=math.ceil(wait_ms / 1000), max_retries=None)
+
+    title = Blog.objects.filter(id=blog_id).values_list("title", flat=True).first()
+    if title is None:
+        return 0
+
+    recipients = []
+    for follower_id, email in AuthorFollower.objects.filter(
+        id__in=follower_ids
+    ).values_list("id", "user__email"):
+        if not email:
+            continue
+        marker = f"follower_fanout_sent:{blog_id}:{follower_id}"
+        if cache.add(marker, 1, SENT_MARKER_TIMEOUT):
+            recipients.append((marker, email))
+
+    sent = 0
+    try:
+        with mail.get_connection() as connection:
+            for marker, email in recipients:
+                message = mail.EmailMessage(
+                    subject=f"New blog: {title}",
+                    body=f"{title} was just published by an author you follow.",
+                    to=[email],
+                )
+                connection.send_messages([message])
+                sent += 1
+    except Exception as e:
+        # Only the recipients which did not get the email are retried.
+        cache.delete_many([marker for marker, _ in recipients[sent:]])
+        _incr(_progress_key(blog_id, "emails_sent"), sent)
+        raise self.retry(exc=e)
 
-@task(bind=True)
-def send_email_to_followers(self, author_id, blog_id):
-    print(f"Sending email to followers of author {author_id} for blog {blog_id}")
+    _incr(_progress_key(blog_id, "emails_sent"), sent)
+    _incr(_progress_key(blog_id, "batches_done"))
+    return sent
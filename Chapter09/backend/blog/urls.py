@@ -1,5 +1,6 @@
 from django.urls import path
 
+from blog import async_views
 from blog import views
 
 
@@ -8,6 +9,10 @@ urlpatterns = [
     path("perm-check/", views.update_blog_title),
     path("unpaginated/", views.get_blog_without_pagination),
     path("paginated/", views.get_blog_with_pagination),
+    path("search/", views.search_blogs),
     path("publish/", views.publish_blog),
     path("verify/", views.verify_blog),
+    path("async/find-by-author/", async_views.get_blogs_by_author),
+    path("async/paginated/", async_views.get_blog_with_pagination),
+    path("async/<int:blog_id>/", async_views.get_blog_detail),
 ]
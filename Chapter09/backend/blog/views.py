@@ -1,31 +1,44 @@
+from django.db import router
+from django.db import transaction
 from django.http import HttpResponse
 
-from cacheops import cached
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.throttling import AnonRateThrottle
-from rest_framework.throttling import ScopedRateThrottle
 
 
+from blog import search
 from blog.tasks import send_email_to_followers
 from blog.models import Blog
+from blog.pagination import get_page
+from blog.pagination import get_page_size
+from blog.pagination import paginate_by_cursor
 from blog.serializers import BlogSerializer
+from common.cache_util import two_tier_cached
+from common.conditional_util import collection_condition
 from common.logging_util import log_event
+from common.outbox import enqueue_task
+from common.permission_util import has_group
+from common.permission_util import has_perm
+from common.query_middleware import query_budget
+from common.serializer_util import parse_requested_fields
+from common.streaming_util import streaming_json_response
+from common.throttling import GCRAAnonRateThrottle
+from common.throttling import GCRAScopedRateThrottle
 from config.celery import debug_task
 
 
 def update_blog_title(request):
     blog_id = request.GET.get("id")
     blog = Blog.objects.get(id=blog_id)
-    if request.user.has_perm("blog.update_title"):
+    if has_perm(request.user, "blog.update_title"):
         # perform operation
         return HttpResponse("User has permission to update title")
     return HttpResponse("User does not have permission to update title")
 
 
 def check_permission(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+    return has_group(user, group_name)
 
 
 @api_view(["POST"])
@@ -37,11 +50,13 @@ def blog_view(request):
 
 
 # Cache the result of this function for 10 minutes, it would be unique for each author_id.
-@cached(timeout=60 * 10)
-def get_all_blogs(author_id):
+# With L1_CACHE_ENABLED hot authors are also kept in process, skipping Redis.
+@two_tier_cached(depends_on=[Blog], timeout=60 * 10)
+def get_all_blogs(author_id, fields=None):
     print("Fetching blogs from database")
     blogs = Blog.objects.filter(author_id=author_id)
-    blogs_data = BlogSerializer(blogs, many=True).data
+    blogs = BlogSerializer.setup_eager_loading(blogs, fields=fields)
+    blogs_data = BlogSerializer.represent_many(blogs, fields=fields)
     return blogs_data
 
 
@@ -50,9 +65,13 @@ def demo():
 
 
 @api_view(["GET"])
+@collection_condition(
+    lambda request: Blog.objects.filter(author_id=request.GET.get("author_id"))
+)
 def get_blogs_by_author(request):
     author_id = request.GET.get("author_id")
-    blogs = get_all_blogs(author_id)
+    fields = parse_requested_fields(request, BlogSerializer)
+    blogs = get_all_blogs(author_id, fields)
     log_event("get_blogs_by_author", {"author_id": author_id})
     demo()
     return Response({"blogs": blogs})
@@ -60,7 +79,7 @@ def get_blogs_by_author(request):
 
 # Throttling anonymous users.
 class BlogApiView(APIView):
-    throttle_classes = [AnonRateThrottle]
+    throttle_classes = [GCRAAnonRateThrottle]
 
     def get(self, request):
         content = {"status": "request was permitted"}
@@ -68,7 +87,7 @@ class BlogApiView(APIView):
 
 
 class Blog2ApiView(APIView):
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [GCRAScopedRateThrottle]
     throttle_scope = "blog_limit"
 
     def get(self, request):
@@ -77,7 +96,7 @@ class Blog2ApiView(APIView):
 
 
 class BlogDetailApiView(APIView):
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [GCRAScopedRateThrottle]
     throttle_scope = "blog_limit"
 
     def get(self, request):
@@ -86,7 +105,7 @@ class BlogDetailApiView(APIView):
 
 
 class Blog3ApiView(APIView):
-    throttle_classes = [ScopedRateThrottle]
+    throttle_classes = [GCRAScopedRateThrottle]
     throttle_scope = "blog_2_limit"
 
     def get(self, request):
@@ -95,22 +114,77 @@ class Blog3ApiView(APIView):
 
 
 # Unpaginated view for blogs returning all the blogs in the database.
+# Pass `stream=json` or `stream=ndjson` to stream the rows with bounded memory.
+# All the blog list views accept `fields=id,title` to only fetch those columns.
+@query_budget(5)
 @api_view(["GET"])
 def get_blog_without_pagination(request):
-    blogs = Blog.objects.all()
-    blogs_data = BlogSerializer(blogs, many=True).data
+    fields = parse_requested_fields(request, BlogSerializer)
+    stream = request.GET.get("stream")
+    if stream in ("json", "ndjson"):
+        # Rows are fetched while the response is consumed, after the request
+        # middleware returned, pick the database while still in the request.
+        blogs = Blog.objects.using(router.db_for_read(Blog)).order_by("id")
+        return streaming_json_response(
+            BlogSerializer.setup_eager_loading(blogs, fields=fields),
+            BlogSerializer,
+            key="blogs",
+            ndjson=stream == "ndjson",
+            fields=fields,
+        )
+
+    blogs = BlogSerializer.setup_eager_loading(Blog.objects.all(), fields=fields)
+    blogs_data = BlogSerializer.represent_many(blogs, fields=fields)
     return Response({"blogs": blogs_data})
 
 
 # Paginated view for blogs returning 10 blogs per page.
+# Pass `mode=cursor` (or a `cursor` from a previous response) to use keyset
+# pagination, which costs the same for the first and the last page.
+@query_budget(5)
 @api_view(["GET"])
+@collection_condition(lambda request: Blog.objects.all())
 def get_blog_with_pagination(request):
-    page = int(request.GET.get("page", 1))
-    page_size = int(request.GET.get("page_size", 10))
+    page_size = get_page_size(request)
+    fields = parse_requested_fields(request, BlogSerializer)
+    cursor = request.GET.get("cursor")
+    if cursor or request.GET.get("mode") == "cursor":
+        blogs = BlogSerializer.setup_eager_loading(
+            Blog.objects.all(), fields=fields, required=("id", "created_at")
+        )
+        blogs, next_cursor, previous_cursor = paginate_by_cursor(
+            blogs, cursor=cursor, page_size=page_size
+        )
+        blogs_data = BlogSerializer.represent_many(blogs, fields=fields)
+        return Response(
+            {"blogs": blogs_data, "next": next_cursor, "previous": previous_cursor}
+        )
+
+    page = get_page(request)
     offset = (page - 1) * page_size
     limit = page * page_size
-    blogs = Blog.objects.all()[offset:limit]
-    blogs_data = BlogSerializer(blogs, many=True).data
+    blogs = Blog.objects.order_by("created_at", "id")
+    blogs = BlogSerializer.setup_eager_loading(blogs, fields=fields)[offset:limit]
+    blogs_data = BlogSerializer.represent_many(blogs, fields=fields)
+    return Response({"blogs": blogs_data})
+
+
+# Ranked full text search over title and content, `fuzzy=1` matches titles
+# by trigram similarity instead.
+@api_view(["GET"])
+def search_blogs(request):
+    text = request.GET.get("q", "").strip()
+    if not text:
+        return Response({"q": "This parameter is required."}, status=400)
+    page_size = get_page_size(request)
+    offset = (get_page(request) - 1) * page_size
+    fuzzy = request.GET.get("fuzzy") in ("1", "true")
+    fields = parse_requested_fields(request, BlogSerializer)
+    blogs = search.search_blogs(Blog.objects.all(), text, fuzzy=fuzzy)
+    blogs = BlogSerializer.setup_eager_loading(blogs, fields=fields)
+    blogs_data = BlogSerializer.represent_many(
+        blogs[offset : offset + page_size], fields=fields
+    )
     return Response({"blogs": blogs_data})
 
 
@@ -119,7 +193,9 @@ def publish_blog(request):
     blog_id = request.GET.get("blog_id")
     author_id = request.GET.get("author_id")
     print(f"Publishing blog {blog_id}")
-    send_email_to_followers.delay(author_id, blog_id)
+    # Written with the publish changes, relayed to Celery by `relay_outbox`.
+    with transaction.atomic():
+        enqueue_task(send_email_to_followers, author_id, blog_id)
     return Response({"status": "success"})
 
 
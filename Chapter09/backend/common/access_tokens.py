@@ -0,0 +1,191 @@
+import threading
+import time
+
+import redis
+from cacheops.redis import redis_client
+from django.conf import settings
+from django.core import signing
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from common.logging_util import log_event
+from common.models import AccessTokenUser
+from common.permission_util import get_access_versions
+from common.permission_util import get_user_access
+from common.permission_util import invalidate_user_access
+from common.permission_util import user_access_changed
+
+SALT = "common.access_tokens"
+REVOCATIONS_KEY = "access_token_revocations"
+# Revocation time per field, lets revoke() find the expired entries without
+# reading the whole list.
+REVOKED_AT_KEY = "access_token_revocations:revoked_at"
+GLOBAL_REVOCATION = "*"
+
+
+def access_tokens_enabled():
+    return getattr(settings, "ACCESS_TOKENS_ENABLED", False)
+
+
+def get_access_token_ttl():
+    return getattr(settings, "ACCESS_TOKEN_TTL", 60 * 5)
+
+
+def issue_access_token(user):
+    """
+    Returns a short lived access token signed with SECRET_KEY, embedding the
+    user id, group names and the access versions of the user.
+    """
+    payload = {
+        "uid": user.pk,
+        "un": user.get_username(),
+        "st": user.is_staff,
+        "su": user.is_superuser,
+        "g": sorted(get_user_access(user).groups),
+        "pv": get_access_versions(user.pk),
+    }
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+class RevocationList:
+    """
+    Minimum access versions per user id, `*` for the global one. Tokens signed
+    with an older version are revoked. Entries are dropped once every token
+    they revoke has expired, so the list stays small and is held in memory,
+    refreshed from Redis every `ACCESS_TOKEN_REVOCATION_REFRESH` seconds.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def entries(self):
+        refresh = getattr(settings, "ACCESS_TOKEN_REVOCATION_REFRESH", 5)
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > refresh:
+            with self._lock:
+                if self._loaded_at is None or now - self._loaded_at > refresh:
+                    try:
+                        stored = redis_client.hgetall(REVOCATIONS_KEY)
+                    except redis.RedisError as e:
+                        # Keep the last known list, retried after `refresh`.
+                        log_event(
+                            "access_token_revocations_unavailable",
+                            {"error": str(e)},
+                            level="WARNING",
+                        )
+                        stored = None
+                    if stored is not None:
+                        self._entries = {
+                            field.decode(): int(value.split(b":")[0])
+                            for field, value in stored.items()
+                        }
+                    self._loaded_at = now
+        return self._entries
+
+    def is_revoked(self, user_id, versions):
+        entries = self.entries()
+        global_version, user_version = versions
+        if global_version < entries.get(GLOBAL_REVOCATION, 0):
+            return True
+        return user_version < entries.get(str(user_id), 0)
+
+    def revoke(self, field, version):
+        now = int(time.time())
+        try:
+            expired = redis_client.zrangebyscore(
+                REVOKED_AT_KEY, "-inf", now - get_access_token_ttl()
+            )
+            expired = [name for name in expired if name.decode() != field]
+            pipe = redis_client.pipeline()
+            if expired:
+                pipe.hdel(REVOCATIONS_KEY, *expired)
+                pipe.zrem(REVOKED_AT_KEY, *expired)
+            pipe.hset(REVOCATIONS_KEY, field, f"{version}:{now}")
+            pipe.zadd(REVOKED_AT_KEY, {field: now})
+            pipe.execute()
+        except redis.RedisError as e:
+            # Only this process knows the revocation, the other ones accept
+            # the tokens until they expire.
+            log_event(
+                "access_token_revocation_failed",
+                {"field": field, "version": version, "error": str(e)},
+                level="ERROR",
+            )
+        with self._lock:
+            self._entries = {**self._entries, field: version}
+
+
+revocations = RevocationList()
+
+
+def user_from_access_token(token):
+    """
+    Returns a read only AccessTokenUser carrying the id, username, flags and
+    `token_groups` of a valid access token, None otherwise. No database or cache lookup is
+    made, other than the periodic revocation list refresh.
+    """
+    if not access_tokens_enabled():
+        return None
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=get_access_token_ttl())
+    except signing.BadSignature:
+        return None
+    if revocations.is_revoked(payload["uid"], payload["pv"]):
+        return None
+    user = AccessTokenUser(
+        id=payload["uid"],
+        username=payload["un"],
+        is_active=True,
+        is_staff=payload["st"],
+        is_superuser=payload["su"],
+    )
+    user.token_groups = frozenset(payload["g"])
+    return user
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates `Authorization: Bearer <access token>` headers. request.user
+    is not loaded from the database, only the fields of the token are set.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        if not access_tokens_enabled():
+            return None
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        token = auth[1].decode()
+        user = user_from_access_token(token)
+        if user is None:
+            raise exceptions.AuthenticationFailed("Invalid or expired access token.")
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+@receiver(user_access_changed)
+def revoke_access_tokens(sender, user_id, version, **kwargs):
+    if not access_tokens_enabled():
+        return
+    field = GLOBAL_REVOCATION if user_id is None else str(user_id)
+    revocations.revoke(field, version)
+
+
+@receiver(post_delete, sender=Token)
+def revoke_deleted_token_access(sender, instance, **kwargs):
+    # Logout or refresh token rotation, the access tokens go with it.
+    if not access_tokens_enabled():
+        return
+    invalidate_user_access(instance.user_id)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     name = "common"
+
+    def ready(self):
+        # Connects the invalidation signals of the cached tokens and permissions.
+        from common import access_tokens  # noqa: F401
+        from common import authentication  # noqa: F401
+        from common import permission_util  # noqa: F401
+
+        # Records the queries of connections opened before the first request.
+        from common import query_middleware  # noqa: F401
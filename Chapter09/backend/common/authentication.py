@@ -0,0 +1,154 @@
+import copy
+import hashlib
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from common.cache_util import LocalLRUCache
+from common.cache_util import ensure_invalidation_listener
+from common.cache_util import invalidate_local_caches
+from common.cache_util import register_local_cache
+from common.logging_util import log_event
+
+LOCAL_CACHE_LABEL = "authtoken.token"
+
+_local_cache = LocalLRUCache(
+    max_entries=getattr(settings, "TOKEN_AUTH_LOCAL_MAX_ENTRIES", 10000),
+    timeout=getattr(settings, "TOKEN_AUTH_LOCAL_TIMEOUT", 30),
+)
+register_local_cache(LOCAL_CACHE_LABEL, _local_cache)
+
+# source -> [count, total seconds], source is "local", "redis" or "db"
+_stats = {source: [0, 0.0] for source in ("local", "redis", "db", "failed")}
+
+
+def _cache_key(key):
+    # Raw tokens are never written to Redis.
+    return f"auth_token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def get_auth_stats():
+    """Returns the number of authentications and their mean latency per source."""
+    return {
+        source: {
+            "count": count,
+            "avg_ms": round(total / count * 1000, 3) if count else 0,
+        }
+        for source, (count, total) in _stats.items()
+    }
+
+
+def _record(source, duration):
+    stats = _stats[source]
+    stats[0] += 1
+    stats[1] += duration
+
+
+def invalidate_tokens(keys):
+    """Drops the tokens from Redis and from the local cache of every worker."""
+    keys = list(keys)
+    if not keys:
+        return
+    cache.delete_many([_cache_key(key) for key in keys])
+    if getattr(settings, "TOKEN_AUTH_LOCAL_TIMEOUT", 30):
+        invalidate_local_caches(LOCAL_CACHE_LABEL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement of `TokenAuthentication` resolving the token from an
+    in-process TTL cache, then Redis, then the database. Deleting a token or
+    saving its user (deactivation) invalidates both caches.
+    """
+
+    def authenticate_credentials(self, key):
+        start = time.perf_counter()
+        source = "failed"
+        try:
+            source, (user, token) = self._resolve(key)
+        finally:
+            _record(source, time.perf_counter() - start)
+        # Views may set attributes on request.user, keep the cached one clean.
+        return copy.copy(user), token
+
+    async def aauthenticate_credentials(self, key):
+        """
+        Async version of `authenticate_credentials` for async views, only the
+        Redis and database lookups run in a thread.
+        """
+        if getattr(settings, "TOKEN_AUTH_LOCAL_TIMEOUT", 30):
+            start = time.perf_counter()
+            hit, value = _local_cache.get(key)
+            if hit:
+                _record("local", time.perf_counter() - start)
+                user, token = value
+                return copy.copy(user), token
+        return await sync_to_async(self.authenticate_credentials)(key)
+
+    def _resolve(self, key):
+        timeout = getattr(settings, "TOKEN_AUTH_LOCAL_TIMEOUT", 30)
+        if timeout:
+            try:
+                ensure_invalidation_listener()
+            except redis.RedisError as e:
+                # Without the listener deleted tokens would stay valid in the
+                # local cache, skip it until Redis is back.
+                log_event(
+                    "token_cache_unavailable", {"error": str(e)}, level="WARNING"
+                )
+                timeout = 0
+            else:
+                hit, value = _local_cache.get(key)
+                if hit:
+                    return "local", value
+
+        try:
+            value = cache.get(_cache_key(key))
+        except redis.RedisError as e:
+            log_event("token_cache_unavailable", {"error": str(e)}, level="WARNING")
+            # Raises AuthenticationFailed for unknown tokens and inactive users.
+            return "db", super().authenticate_credentials(key)
+        source = "redis"
+        if value is None:
+            value = super().authenticate_credentials(key)
+            cache.set(
+                _cache_key(key),
+                value,
+                getattr(settings, "TOKEN_AUTH_CACHE_TIMEOUT", 60 * 5),
+            )
+            source = "db"
+        if timeout:
+            _local_cache.set(key, value)
+        return source, value
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # The primary key of the instance is cleared once the delete is done.
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_tokens([key]))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    if update_fields == {"last_login"}:
+        return
+
+    # The cached user is stale, e.g. after a deactivation.
+    def invalidate():
+        invalidate_tokens(
+            Token.objects.filter(user_id=instance.pk).values_list("key", flat=True)
+        )
+
+    transaction.on_commit(invalidate)
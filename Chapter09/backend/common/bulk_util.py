@@ -0,0 +1,36 @@
+import io
+
+
+def copy_value(value):
+    """Returns the value in Postgres COPY text format."""
+    if value is None:
+        return "\\N"
+    value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def reserve_ids(cursor, model, count):
+    """Reserves `count` primary keys from the Postgres sequence of the model table."""
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+        "FROM generate_series(1, %s)",
+        [model._meta.db_table, count],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def copy_rows(cursor, model, columns, rows):
+    """Inserts the rows (tuples matching `columns`) with Postgres COPY FROM STDIN."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN", buffer
+    )
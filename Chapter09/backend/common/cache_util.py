@@ -0,0 +1,182 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from cacheops import cached_as
+from cacheops.redis import redis_client
+from cacheops.signals import cache_invalidated
+from cacheops.signals import cache_read
+from cacheops.sharding import get_prefix
+from cacheops.utils import get_cache_key
+from django.conf import settings
+
+INVALIDATION_CHANNEL = "l1_cache_invalidation"
+# Published instead of a model label when cacheops flushes everything.
+ALL_MODELS = "*"
+
+
+class LocalLRUCache:
+    """
+    In-process LRU cache bounded by number of entries and total size in bytes.
+    Values are stored as is, so callers must not mutate what they get back.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=1024 * 1024 * 50, timeout=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns a (hit, value) tuple for the given key."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, size, time.monotonic() + self.timeout)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _pop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+
+# Model label -> local caches depending on it, flushed when the model is invalidated.
+_caches_by_model = {}
+_listener_lock = threading.Lock()
+_listener_thread = None
+
+
+def _clear_local_caches(model_label):
+    if model_label == ALL_MODELS:
+        local_caches = [c for caches in _caches_by_model.values() for c in caches]
+    else:
+        local_caches = _caches_by_model.get(model_label, [])
+    for local_cache in local_caches:
+        local_cache.clear()
+
+
+def _on_invalidation_message(message):
+    _clear_local_caches(message["data"].decode())
+
+
+def ensure_invalidation_listener():
+    """Subscribes this worker to invalidations published by every other worker."""
+    global _listener_thread
+    if _listener_thread is not None:
+        return
+    with _listener_lock:
+        if _listener_thread is None:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation_message})
+            _listener_thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+def register_local_cache(label, local_cache):
+    """Flushes `local_cache` in every worker on `invalidate_local_caches(label)`."""
+    _caches_by_model.setdefault(label, []).append(local_cache)
+
+
+def invalidate_local_caches(label):
+    _clear_local_caches(label)
+    redis_client.publish(INVALIDATION_CHANNEL, label)
+
+
+def _publish_invalidation(sender, obj_dict, **kwargs):
+    if sender is None:
+        # `invalidate_all()` flushed the whole Redis database.
+        invalidate_local_caches(ALL_MODELS)
+        return
+    model_label = sender._meta.label_lower
+    if model_label in _caches_by_model:
+        invalidate_local_caches(model_label)
+
+
+cache_invalidated.connect(_publish_invalidation)
+
+
+def two_tier_cached(
+    depends_on, timeout=60 * 10, local_timeout=60, max_entries=1000, max_bytes=None
+):
+    """
+    Same as cacheops `@cached_as`, with an opt-in in-process LRU cache in front
+    of Redis. Enable it with the `L1_CACHE_ENABLED` setting.
+    :param depends_on: Models the result is cached as, their invalidation by
+        cacheops flushes both the Redis and the in-process cache of every worker
+    :param timeout: Redis timeout in seconds, passed to cacheops
+    :param local_timeout: In-process timeout in seconds
+    :param max_entries: Maximum number of results kept in process
+    :param max_bytes: Maximum pickled size of results kept in process
+    """
+
+    def decorator(func):
+        redis_cached_func = cached_as(*depends_on, timeout=timeout)(func)
+        if not getattr(settings, "L1_CACHE_ENABLED", False):
+            return redis_cached_func
+
+        local_cache = LocalLRUCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes
+            or getattr(settings, "L1_CACHE_MAX_BYTES", 1024 * 1024 * 50),
+            timeout=local_timeout,
+        )
+        for model in depends_on:
+            register_local_cache(model._meta.label_lower, local_cache)
+
+        stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+
+        original_func = func
+
+        def count_redis_read(sender, func, hit, **kwargs):
+            if func is original_func:
+                stats["l2_hits" if hit else "l2_misses"] += 1
+
+        cache_read.connect(count_redis_read, weak=False)
+
+        def key(*args, **kwargs):
+            return get_prefix(func=func) + "l1:" + get_cache_key(func, args, kwargs)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            ensure_invalidation_listener()
+            cache_key = key(*args, **kwargs)
+            hit, value = local_cache.get(cache_key)
+            if hit:
+                stats["l1_hits"] += 1
+                return value
+            stats["l1_misses"] += 1
+            value = redis_cached_func(*args, **kwargs)
+            local_cache.set(cache_key, value)
+            return value
+
+        wrapper.key = key
+        wrapper.stats = lambda: dict(stats)
+        wrapper.local_cache = local_cache
+        return wrapper
+
+    return decorator
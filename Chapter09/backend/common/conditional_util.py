@@ -0,0 +1,56 @@
+import hashlib
+
+from cacheops import cached_as
+from cacheops.conf import model_profile
+from django.db.models import Count
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+
+def get_collection_state(queryset, timeout=60 * 10):
+    """
+    Returns (max updated_at, count) of the queryset, cached by cacheops until a
+    row matching the queryset changes. Models without a CACHEOPS profile are
+    aggregated on every call.
+    """
+
+    def _collection_state():
+        state = queryset.aggregate(
+            last_modified=Max("updated_at"), count=Count("id")
+        )
+        return state["last_modified"], state["count"]
+
+    if model_profile(queryset.model) is None:
+        return _collection_state()
+    return cached_as(queryset, timeout=timeout)(_collection_state)()
+
+
+def collection_condition(get_queryset):
+    """
+    Adds weak ETag and Last-Modified headers to a collection view and answers
+    conditional GETs with 304 Not Modified before the view serializes anything.
+    Put it below `@api_view` so authentication and throttling still apply.
+    :param get_queryset: Function returning the queryset behind a request's response
+    """
+
+    def _state(request):
+        if not hasattr(request, "_collection_state"):
+            request._collection_state = get_collection_state(get_queryset(request))
+        return request._collection_state
+
+    def etag_func(request, *args, **kwargs):
+        last_modified, count = _state(request)
+        signature = "|".join(
+            [
+                request.path,
+                "&".join(sorted(f"{k}={v}" for k, v in request.GET.items())),
+                last_modified.isoformat() if last_modified else "",
+                str(count),
+            ]
+        )
+        return 'W/"%s"' % hashlib.md5(signature.encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        return _state(request)[0]
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
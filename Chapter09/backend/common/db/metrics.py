@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+from common.logging_util import log_event
+
+_lock = threading.Lock()
+_stats = {
+    "opened": 0,
+    "closed": 0,
+    "connect_seconds": 0.0,
+    "max_connect_seconds": 0.0,
+    "requests": 0,
+    "reused": 0,
+    "in_flight": 0,
+}
+_last_logged = time.monotonic()
+
+
+def record_connect(duration):
+    with _lock:
+        _stats["opened"] += 1
+        _stats["connect_seconds"] += duration
+        _stats["max_connect_seconds"] = max(_stats["max_connect_seconds"], duration)
+
+
+def record_close():
+    with _lock:
+        _stats["closed"] += 1
+
+
+def get_connection_stats():
+    """
+    Connection metrics of this process. `open` is the number of persistent
+    connections held, `utilization` the share of them serving a request,
+    `reuse_ratio` the share of requests which found a connection already open
+    and `avg_connect_ms` the time a request waited for a new connection.
+    """
+    with _lock:
+        stats = dict(_stats)
+    open_connections = stats["opened"] - stats["closed"]
+    in_use = min(stats["in_flight"], open_connections)
+    return {
+        "open": open_connections,
+        "opened": stats["opened"],
+        "in_flight": stats["in_flight"],
+        "utilization": round(_ratio(in_use, open_connections), 2),
+        "reuse_ratio": round(_ratio(stats["reused"], stats["requests"]), 2),
+        "avg_connect_ms": round(
+            _ratio(stats["connect_seconds"], stats["opened"]) * 1000, 2
+        ),
+        "max_connect_ms": round(stats["max_connect_seconds"] * 1000, 2),
+    }
+
+
+def _ratio(value, total):
+    return value / total if total else 0
+
+
+@receiver(request_started)
+def count_request(sender, **kwargs):
+    # Runs after Django closed the obsolete connections of this thread.
+    reused = connections["default"].connection is not None
+    with _lock:
+        _stats["requests"] += 1
+        _stats["reused"] += reused
+        _stats["in_flight"] += 1
+
+
+@receiver(request_finished)
+def log_connection_stats(sender, **kwargs):
+    global _last_logged
+    with _lock:
+        _stats["in_flight"] -= 1
+    interval = getattr(settings, "DB_METRICS_LOG_INTERVAL", 60)
+    now = time.monotonic()
+    if interval and now - _last_logged > interval:
+        _last_logged = now
+        log_event("db_connection_stats", get_connection_stats())
@@ -0,0 +1,24 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from common.db import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Postgres backend recording the connection metrics of common.db.metrics.
+    Connections are kept open between requests by CONN_MAX_AGE and checked
+    before reuse by CONN_HEALTH_CHECKS, see DATABASES in config/settings.py.
+    """
+
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        metrics.record_connect(time.perf_counter() - start)
+        return connection
+
+    def _close(self):
+        super()._close()
+        if self.connection is not None:
+            metrics.record_close()
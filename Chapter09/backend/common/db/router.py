@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import DatabaseError
+from django.db import connections
+
+from common.logging_util import log_event
+
+PIN_COOKIE = "pin_primary"
+
+# Routing state of the current request, a dict so that writes made in a thread
+# of sync_to_async are seen by the middleware. None outside of requests.
+_routing = ContextVar("replica_routing", default=None)
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class ReplicaLagMonitor:
+    """Replication lag in seconds per replica, measured at most every interval."""
+
+    def __init__(self):
+        # alias -> (checked_at, lag)
+        self._lags = {}
+        self._lock = threading.Lock()
+
+    def lag(self, alias):
+        interval = getattr(settings, "REPLICA_LAG_CHECK_INTERVAL", 5)
+        now = time.monotonic()
+        checked_at, lag = self._lags.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < interval:
+            return lag
+        with self._lock:
+            # Another thread may have measured it while this one waited.
+            checked_at, lag = self._lags.get(alias, (None, None))
+            now = time.monotonic()
+            if checked_at is not None and now - checked_at < interval:
+                return lag
+            lag = self.measure(alias)
+            self._lags[alias] = (now, lag)
+        return lag
+
+    def measure(self, alias):
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            return 0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError as e:
+            log_event("replica_unavailable", {"alias": alias, "error": str(e)})
+            return float("inf")
+        # No transaction replayed yet, the replica is still catching up.
+        return float("inf") if lag is None else float(lag)
+
+
+lag_monitor = ReplicaLagMonitor()
+
+
+def pin_to_primary():
+    """Sends the reads of this request, and of the next PIN seconds, to the primary."""
+    state = _routing.get()
+    if state is not None:
+        state["wrote"] = True
+
+
+class ReplicaRouter:
+    """
+    Sends reads of requests to a replica of `DATABASE_REPLICAS` whose lag is
+    under `REPLICA_MAX_LAG_SECONDS`, writes to the primary. After a write, the
+    reads of the same client stay on the primary for `REPLICA_PIN_SECONDS`,
+    see ReplicaPinMiddleware. Reads inside a transaction and outside of
+    requests (Celery, commands) always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is not None and (state["pinned"] or state["wrote"]):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        # Related rows are read from the database the instance came from, also
+        # when a streamed response is consumed after the request.
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if state is None:
+            return DEFAULT_DB_ALIAS
+        # One replica per request, so a response never mixes replicas.
+        if state["replica"] is None:
+            state["replica"] = self.choose_replica()
+        return state["replica"]
+
+    def choose_replica(self):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 10)
+        healthy = [alias for alias in replicas if lag_monitor.lag(alias) <= max_lag]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, "DATABASE_REPLICAS", [])
+
+
+class ReplicaPinMiddleware:
+    """
+    Tracks the writes of a request for ReplicaRouter, a request which wrote
+    sets a cookie pinning the reads of the client to the primary.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.get_state(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        state = self.get_state(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.process_response(state, response)
+
+    def get_state(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        return {
+            "pinned": pinned_until > time.time(),
+            "wrote": False,
+            "replica": None,
+        }
+
+    def process_response(self, state, response):
+        if state["wrote"]:
+            pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + pin_seconds),
+                max_age=pin_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -1,12 +1,27 @@
-from threading import local
-from uuid import uuid4
+import itertools
+import os
+from contextvars import ContextVar
 
-_thread_locals = local()
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+
+# Context variables are isolated per thread, per asyncio task and per Celery
+# task, unlike threading.local which leaks between tasks sharing a thread.
+_request = ContextVar("request", default=None)
+_txid = ContextVar("txid", default=None)
+
+_request_counter = itertools.count(1)
+_request_id_prefix = os.urandom(4).hex()
+
+
+def new_txid():
+    """Returns a unique transaction id without generating a uuid per request."""
+    return f"{_request_id_prefix}{os.getpid():x}-{next(_request_counter):x}"
 
 
 def get_current_request():
-    """Returns the request object in thread local storage."""
-    return getattr(_thread_locals, "request", None)
+    """Returns the request object of the current context."""
+    return _request.get()
 
 
 def get_current_user():
@@ -18,30 +33,53 @@ def get_current_user():
 
 def get_txid():
     """Returns the current transaction id, if exist, otherwise returns None."""
-    return getattr(_thread_locals, "txid", None)
+    return _txid.get()
 
 
 def get_current_user_id():
-    """Returns authenticated user's id for this thread, if not present returns 0."""
+    """Returns authenticated user's id for this context, if not present returns 0."""
     user = get_current_user()
     if user and user.id:
         return user.id
     return 0
 
 
+def set_request_context(request=None, txid=None):
+    """
+    Populates the request context, returns the tokens to pass to
+    `reset_request_context` once the unit of work is done.
+    """
+    return _request.set(request), _txid.set(txid or new_txid())
+
+
+def reset_request_context(tokens):
+    request_token, txid_token = tokens
+    _request.reset(request_token)
+    _txid.reset(txid_token)
+
+
 class PopulateLocalsThreadMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        print("custom middleware before next middleware/view")
-        # Populate the request object in thread local storage to be accessible anywhere
-        _thread_locals.request = request
-        _thread_locals.txid = str(uuid4())
-        # the view (and later middleware) are called.
-        response = self.get_response(request)
-        # Clean up the thread local storage
-        _thread_locals.request = None
-        _thread_locals.tx_id = None
-        print("custom middleware after response is returned")
-        return response
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Populate the request object in the context to be accessible anywhere
+        tokens = set_request_context(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_request_context(tokens)
+
+    async def __acall__(self, request):
+        tokens = set_request_context(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_request_context(tokens)
@@ -1,25 +1,208 @@
-import json
+import atexit
+import copy
 import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+import orjson
+from django.conf import settings
 
 from common.localthread_middleware import get_current_user_id
 from common.localthread_middleware import get_txid
 
 
+def _dumps(msg):
+    return orjson.dumps(msg, default=str).decode()
+
+
+def _handlers_of(logger):
+    """Handlers a record of `logger` goes to, same walk as `Logger.callHandlers`."""
+    while logger:
+        yield from logger.handlers
+        if not logger.propagate:
+            break
+        logger = logger.parent
+
+
+def _emit_batch(handler, records):
+    """
+    Writes the records under one acquisition of the handler lock. Stream and
+    file handlers get the whole batch in one write and one flush, other
+    handlers one `emit` per record.
+    """
+    records = [
+        record
+        for record in records
+        if record.levelno >= handler.level and handler.filter(record)
+    ]
+    if not records:
+        return
+    handler.acquire()
+    try:
+        if not isinstance(handler, logging.StreamHandler):
+            for record in records:
+                handler.emit(record)
+            return
+        terminator = handler.terminator
+        text = "".join(handler.format(record) + terminator for record in records)
+        if handler.stream is None:
+            # FileHandler opened with delay=True.
+            handler.stream = handler._open()
+        if (
+            isinstance(handler, RotatingFileHandler)
+            and handler.maxBytes > 0
+            and handler.stream.tell() > 0
+            and handler.stream.tell() + len(text) >= handler.maxBytes
+        ):
+            handler.doRollover()
+        handler.stream.write(text)
+        handler.flush()
+    finally:
+        handler.release()
+
+
+class LogBatchWriter(threading.Thread):
+    """
+    Background thread draining the log queue, records are serialized and handed
+    to the configured logging handlers in batches of up to `batch_size` or every
+    `flush_interval` seconds, whichever comes first.
+    """
+
+    def __init__(self, log_queue, batch_size, flush_interval):
+        super().__init__(name="log-batch-writer", daemon=True)
+        self.queue = log_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        # Events which could not be serialized or written.
+        self.failed = 0
+
+    def run(self):
+        while True:
+            self.write(self.next_batch())
+
+    def next_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def drain(self):
+        """Writes everything still queued, used when the process exits."""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.write(batch)
+
+    def write(self, batch):
+        records_by_handler = {}
+        for created, thread_id, logger, level, msg in batch:
+            try:
+                record = logger.makeRecord(
+                    logger.name, level, "", 0, _dumps(msg), None, None
+                )
+                # Keep the time and thread of the request which logged the event.
+                record.created = created
+                record.msecs = (created - int(created)) * 1000
+                record.thread = thread_id
+            except Exception:
+                self.failed += 1
+                self.report_error()
+                continue
+            if logger.disabled or not logger.filter(record):
+                continue
+            for handler in _handlers_of(logger):
+                records_by_handler.setdefault(handler, []).append(record)
+
+        for handler, records in records_by_handler.items():
+            try:
+                _emit_batch(handler, records)
+            except Exception:
+                self.failed += len(records)
+                self.report_error()
+
+    def report_error(self):
+        # Same reporting as logging.Handler.handleError, the record may not
+        # exist yet.
+        if logging.raiseExceptions and sys.stderr:
+            traceback.print_exc(file=sys.stderr)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+_writer_pid = None
+
+
+def get_log_writer():
+    """Returns the log writer of this process, started on first use."""
+    global _writer, _writer_pid
+    # A forked worker does not inherit the writer thread, start a new one.
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            maxsize = getattr(settings, "LOG_QUEUE_SIZE", 10000)
+            log_queue = queue.Queue(maxsize=maxsize)
+            _writer = LogBatchWriter(
+                log_queue,
+                batch_size=getattr(settings, "LOG_BATCH_SIZE", 500),
+                flush_interval=getattr(settings, "LOG_FLUSH_INTERVAL", 0.5),
+            )
+            _writer_pid = os.getpid()
+            _writer.start()
+            atexit.register(_writer.drain)
+    return _writer
+
+
 def log_event(event_name, log_data, logging_module="django_default", level="INFO"):
     """
+    Queues the event for the background log writer, it never blocks the caller.
+    When the queue is above 80% full, INFO and lower events are sampled with
+    `LOG_OVERFLOW_POLICY = "sample"`, when it is full events are dropped.
     :param event_name: Event name which you are logging
     :param log_data: The data you want to log, this can be anything serializable
     :param logging_module: If you want to use any custom module for logging, define it in Django settings
     :param level: Level for which you are logging.
     """
     logger = logging.getLogger(logging_module)
+    levelno = getattr(logging, level)
+    if not logger.isEnabledFor(levelno):
+        return
 
-    try:
-        msg = {"ev": event_name, "data": log_data, "txid": get_txid()}
-        user_id = get_current_user_id()
-        if user_id:
-            msg["uid"] = user_id
-        logger.log(msg=json.dumps(msg), level=getattr(logging, level))
-    except Exception as e:
-        print("Error")  # user error monitoring tool
+    writer = get_log_writer()
+    log_queue = writer.queue
+    if (
+        levelno <= logging.INFO
+        and getattr(settings, "LOG_OVERFLOW_POLICY", "drop") == "sample"
+        and log_queue.qsize() > log_queue.maxsize * 0.8
+        and random.random() * getattr(settings, "LOG_SAMPLE_RATE", 10) >= 1
+    ):
+        writer.dropped += 1
         return
+
+    # The caller may update log_data once this returns, the writer serializes
+    # it later in its own thread. Only the top level is copied.
+    msg = {"ev": event_name, "data": copy.copy(log_data), "txid": get_txid()}
+    user_id = get_current_user_id()
+    if user_id:
+        msg["uid"] = user_id
+    try:
+        log_queue.put_nowait((time.time(), threading.get_ident(), logger, levelno, msg))
+    except queue.Full:
+        writer.dropped += 1
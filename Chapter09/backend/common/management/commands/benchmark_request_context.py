@@ -0,0 +1,50 @@
+import threading
+import timeit
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from common.localthread_middleware import new_txid
+from common.localthread_middleware import reset_request_context
+from common.localthread_middleware import set_request_context
+
+_locals = threading.local()
+
+
+def set_thread_locals():
+    # What PopulateLocalsThreadMiddleware did before the context variables.
+    _locals.request = None
+    _locals.txid = str(uuid.uuid4())
+    del _locals.request, _locals.txid
+
+
+def set_and_reset_context():
+    reset_request_context(set_request_context())
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the per request work of PopulateLocalsThreadMiddleware: the "
+        "transaction id and the request context set and reset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--number", type=int, default=100_000, help="Calls per measurement"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Measurements, the best is kept"
+        )
+
+    def handle(self, *args, **options):
+        cases = [
+            ("uuid4", lambda: str(uuid.uuid4())),
+            ("new_txid", new_txid),
+            ("threading.local set/del", set_thread_locals),
+            ("context set/reset", set_and_reset_context),
+        ]
+        for name, func in cases:
+            best = min(
+                timeit.repeat(func, number=options["number"], repeat=options["repeat"])
+            )
+            self.stdout.write(f"{name:<26} {best / options['number'] * 1e9:>8.0f}ns")
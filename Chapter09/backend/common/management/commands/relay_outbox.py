@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from common.models import OutboxEvent
+from common.outbox import outbox_task_id
+from config.celery import app
+
+
+class Command(BaseCommand):
+    help = "Sends the tasks recorded in the outbox to the Celery broker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of outbox rows sent and deleted per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.5,
+            help="Seconds to sleep when the outbox is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the outbox and exit instead of polling",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        relayed = 0
+        while True:
+            count = self.relay_batch(batch_size)
+            relayed += count
+            if count:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Relayed {relayed} tasks"))
+
+    def relay_batch(self, batch_size):
+        """
+        Sends one batch and deletes it in the same transaction. Locked rows are
+        skipped, so several relays can run side by side.
+        """
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True).order_by(
+                    "id"
+                )[:batch_size]
+            )
+            for event in events:
+                app.send_task(
+                    event.task_name,
+                    args=event.args,
+                    kwargs=event.kwargs,
+                    task_id=outbox_task_id(event.id),
+                )
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+        return len(events)
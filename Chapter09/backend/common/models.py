@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    Celery task waiting to be sent to the broker. Rows are written in the same
+    transaction as the business change and drained by `relay_outbox`.
+    """
+
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.task_name} ({self.id})"
+
+
+class AccessTokenUser(User):
+    """
+    request.user of access token requests, built from the token fields alone.
+    It is never written back, load the User from the database to change it.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError("Users of access tokens are read only.")
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError("Users of access tokens are read only.")
@@ -0,0 +1,16 @@
+from common.models import OutboxEvent
+
+
+def enqueue_task(task, *args, **kwargs):
+    """
+    Records a task for the outbox relay instead of calling `task.delay`. Call it
+    inside the transaction of the business change: the task is only sent if the
+    transaction commits, and the request never waits on the broker.
+    Arguments must be JSON serializable.
+    """
+    return OutboxEvent.objects.create(task_name=task.name, args=args, kwargs=kwargs)
+
+
+def outbox_task_id(event_id):
+    """Stable task id, a task relayed twice after a crash keeps the same id."""
+    return f"outbox-{event_id}"
@@ -0,0 +1,156 @@
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import Signal
+from django.dispatch import receiver
+
+UserAccess = namedtuple("UserAccess", "groups perms")
+NO_ACCESS = UserAccess(frozenset(), frozenset())
+
+# Bumped when a change can affect any user, e.g. the permissions of a group.
+GLOBAL_VERSION_KEY = "user_access_version"
+
+# Sent with the new version after a bump, user_id is None for the global version.
+user_access_changed = Signal()
+
+
+def _user_version_key(user_id):
+    return f"user_access_version:{user_id}"
+
+
+def get_access_versions(user_id):
+    """Returns the current (global version, user version) of the user."""
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A new version never matches an entry cached before the eviction.
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return versions[GLOBAL_VERSION_KEY], versions[_user_version_key(user_id)]
+
+
+def _incr_version(key, user_id):
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+    user_access_changed.send(sender=None, user_id=user_id, version=version)
+
+
+def invalidate_user_access(user_id=None):
+    """Invalidates the cached access of the user, of every user without user_id."""
+    key = GLOBAL_VERSION_KEY if user_id is None else _user_version_key(user_id)
+    # After the commit, a read in between would cache the old data again.
+    transaction.on_commit(lambda: _incr_version(key, user_id))
+
+
+def load_user_access(user):
+    """Reads the group names and the `app_label.codename` permissions of the user."""
+    groups = frozenset(user.groups.values_list("name", flat=True))
+    if user.is_superuser:
+        permissions = Permission.objects.all()
+    else:
+        permissions = Permission.objects.filter(Q(user=user) | Q(group__user=user))
+    perms = frozenset(
+        f"{app_label}.{codename}"
+        for app_label, codename in permissions.values_list(
+            "content_type__app_label", "codename"
+        )
+    )
+    return UserAccess(groups, perms)
+
+
+def get_user_access(user):
+    """
+    Returns the groups and permissions of the user. They are cached on the user
+    object for the request and in Redis under the global and user versions, so
+    a steady state check costs no query.
+    """
+    if not user or user.is_anonymous:
+        return NO_ACCESS
+    access = getattr(user, "_access_cache", None)
+    if access is None:
+        key = "user_access:{}:{}:{}".format(user.pk, *get_access_versions(user.pk))
+        access = cache.get(key)
+        if access is None:
+            access = load_user_access(user)
+            timeout = getattr(settings, "USER_ACCESS_CACHE_TIMEOUT", 60 * 60)
+            cache.set(key, access, timeout)
+        user._access_cache = access
+    return access
+
+
+def has_group(user, group_name):
+    # Users authenticated by a signed access token carry their groups.
+    groups = getattr(user, "token_groups", None)
+    if groups is None:
+        groups = get_user_access(user).groups
+    return group_name in groups
+
+
+def has_perm(user, perm):
+    """Same as `user.has_perm(perm)` without the authentication backends."""
+    if not user or not user.is_active:
+        return False
+    return user.is_superuser or perm in get_user_access(user).perms
+
+
+class CachedPermissionBackend(ModelBackend):
+    """ModelBackend resolving `user.has_perm` from `get_user_access`."""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return get_user_access(user_obj).perms
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        invalidate_user_access(instance.pk)
+        instance.__dict__.pop("_access_cache", None)
+    elif pk_set:
+        # group.user_set.add(...) or permission.user_set.add(...)
+        for user_id in pk_set:
+            invalidate_user_access(user_id)
+    else:
+        # The users of a reverse clear are unknown.
+        invalidate_user_access()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_user_access()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_all(sender, **kwargs):
+    invalidate_user_access()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields == {"last_login"}:
+        return
+    # is_superuser or is_active may have changed.
+    invalidate_user_access(instance.pk)
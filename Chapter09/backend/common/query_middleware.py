@@ -0,0 +1,179 @@
+import re
+import sys
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from common.logging_util import log_event
+
+# Collapses `IN (%s, %s, ...)` so that lookups with a different number of ids
+# share one shape.
+_IN_CLAUSE_RE = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+# QueryRecorder of the current request. A ContextVar reaches the threads of
+# sync_to_async, where the async ORM runs its queries on their own connections.
+_recorder = ContextVar("query_recorder", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Limits the number of SQL queries a view may run for one request, it has to
+    be the outermost decorator of the view.
+    Exceeding the budget raises `QueryBudgetExceeded` when `QUERY_BUDGET_STRICT`
+    is set (tests) and is only logged otherwise.
+    """
+
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+
+    return decorator
+
+
+def normalize_sql(sql):
+    """Returns the shape of a statement, parameters and literals are replaced."""
+    sql = _IN_CLAUSE_RE.sub("IN (...)", sql)
+    return _LITERAL_RE.sub("?", sql)
+
+
+def _calling_frame():
+    """Returns `file:line` of the first project frame which triggered the query."""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and filename != __file__:
+            return f"{filename[len(base_dir) + 1:]}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    def __init__(self):
+        # shape -> [count, total_time, first calling frame]
+        self.shapes = defaultdict(lambda: [0, 0.0, None])
+        self.total_count = 0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            shape = self.shapes[normalize_sql(sql)]
+            if shape[0] == 0:
+                shape[2] = _calling_frame()
+            shape[0] += 1
+            shape[1] += duration
+            self.total_count += 1
+            self.total_time += duration
+
+    def repeated(self, threshold):
+        return [
+            {
+                "sql": sql,
+                "count": count,
+                "time_ms": round(total_time * 1000, 2),
+                "frame": frame,
+            }
+            for sql, (count, total_time, frame) in self.shapes.items()
+            if count >= threshold
+        ]
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@receiver(connection_created)
+def install_on_connect(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+class QueryInspectMiddleware:
+    """
+    Records every SQL statement of a request, logs statement shapes repeated at
+    least `QUERY_REPEAT_THRESHOLD` times (N+1) and enforces `@query_budget`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, "QUERY_REPEAT_THRESHOLD", 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        recorder = QueryRecorder()
+        request.query_budget = None
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.check_queries(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        # Connections of the sync_to_async threads get the recorder when they
+        # connect, see install_on_connect.
+        recorder = QueryRecorder()
+        request.query_budget = None
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        self.check_queries(request, recorder)
+        return response
+
+    def check_queries(self, request, recorder):
+        repeated = recorder.repeated(self.threshold)
+        if repeated:
+            log_event(
+                "n_plus_one_detected",
+                {"path": request.path, "queries": repeated},
+                level="WARNING",
+            )
+
+        budget = request.query_budget
+        if budget is not None and recorder.total_count > budget:
+            data = {
+                "path": request.path,
+                "budget": budget,
+                "count": recorder.total_count,
+                "time_ms": round(recorder.total_time * 1000, 2),
+            }
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(data)
+            log_event("query_budget_exceeded", data, level="WARNING")
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", None)
@@ -0,0 +1,348 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import SkipField
+from rest_framework.relations import ManyRelatedField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.relations import RelatedField
+from rest_framework.settings import api_settings
+
+
+def _collect_relations(
+    serializer, model, prefix, in_prefetch, select, prefetch, field_names=None
+):
+    for name, field in serializer.fields.items():
+        if field.write_only or field.source == "*":
+            continue
+        if field_names is not None and name not in field_names:
+            continue
+
+        current_model = model
+        path = prefix
+        nested_prefetch = in_prefetch
+        resolved = 0
+        for index, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # Model property or method, e.g. `fetch_short_bio`.
+                break
+            if not model_field.is_relation:
+                break
+            path = f"{path}__{attr}" if path else attr
+            if model_field.many_to_many or model_field.one_to_many:
+                nested_prefetch = True
+            current_model = model_field.related_model
+            resolved += 1
+
+            # Related object is rendered as its pk from the local column, no query.
+            if (
+                index == len(field.source_attrs) - 1
+                and isinstance(field, RelatedField)
+                and field.use_pk_only_optimization()
+            ):
+                break
+            (prefetch if nested_prefetch else select).add(path)
+
+        # Only recurse when the whole source resolved to a related model.
+        if resolved != len(field.source_attrs):
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        elif isinstance(field, ManyRelatedField):
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            _collect_relations(
+                field, current_model, path, nested_prefetch, select, prefetch
+            )
+
+
+def setup_eager_loading(queryset, serializer_class, fields=None):
+    """
+    Applies `select_related` and `prefetch_related` for every relation rendered
+    by `serializer_class`, including nested serializers, so that serializing the
+    queryset costs a constant number of queries.
+    :param fields: Only load the relations of these top level fields
+    """
+    select, prefetch = set(), set()
+    _collect_relations(
+        serializer_class(), queryset.model, "", False, select, prefetch, fields
+    )
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*sorted(prefetch))
+    return queryset
+
+
+def parse_requested_fields(request, serializer_class):
+    """
+    Returns the field names requested with `?fields=a,b` in serializer order,
+    None when the parameter is missing.
+    """
+    value = request.GET.get("fields")
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    readable = [
+        name
+        for name, field in serializer_class().fields.items()
+        if not field.write_only
+    ]
+    unknown = requested.difference(readable)
+    if unknown:
+        unknown = ", ".join(sorted(unknown))
+        raise ValidationError({"fields": f"Unknown fields: {unknown}"})
+    return tuple(name for name in readable if name in requested)
+
+
+def only_columns(queryset, serializer_class, fields, required=("id",)):
+    """
+    Defers every column the requested fields do not read. Fields which do not
+    map to a model field (methods, properties) may read anything, in that case
+    the queryset is returned unchanged.
+    """
+    model = queryset.model
+    serializer_fields = serializer_class().fields
+    columns = set(required)
+    for name in fields:
+        field = serializer_fields[name]
+        if field.source == "*":
+            return queryset
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return queryset
+        if model_field.concrete:
+            columns.add(model_field.name)
+    return queryset.only(*sorted(columns))
+
+
+class EagerLoadingMixin:
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, required=("id",)):
+        """
+        :param fields: Requested fields, other columns and relations are not loaded
+        :param required: Columns always loaded when `fields` is given
+        """
+        queryset = setup_eager_loading(queryset, cls, fields)
+        if fields is not None:
+            queryset = only_columns(queryset, cls, fields, required)
+        return queryset
+
+
+def representation_timezone():
+    """
+    Timezone DRF renders datetimes in. Looking it up is slow, resolve it once
+    per batch of rows and pass it to the compiled representation.
+    """
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+def _datetime_to_representation(field):
+    def enforce_timezone(value, current_timezone):
+        # `DateTimeField.enforce_timezone` without the timezone lookup.
+        field_timezone = getattr(field, "timezone", current_timezone)
+        if field_timezone is not None and value.utcoffset() is not None:
+            try:
+                return value.astimezone(field_timezone)
+            except OverflowError:
+                pass
+        return field.enforce_timezone(value)
+
+    def to_representation(value, current_timezone):
+        value = enforce_timezone(value, current_timezone).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    return to_representation
+
+
+# Default of `current_timezone`, None is the timezone without USE_TZ.
+_LOOKUP = object()
+
+
+def _is_default(field, base_class, method="to_representation"):
+    return getattr(type(field), method) is getattr(base_class, method)
+
+
+def _model_field(model, field):
+    """Returns the concrete model field a serializer field reads, if any."""
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    return model_field if model_field.concrete else None
+
+
+def _compile_field(field, model):
+    """
+    Returns a function reading and representing the field of one instance, using
+    the model attribute directly when the DRF field would only convert it.
+    Functions take the instance and the `representation_timezone()`.
+    """
+    model_field = _model_field(model, field)
+    if (
+        model_field is not None
+        and isinstance(field, PrimaryKeyRelatedField)
+        and _is_default(field, PrimaryKeyRelatedField)
+        and _is_default(field, RelatedField, "get_attribute")
+        and field.use_pk_only_optimization()
+        and field.pk_field is None
+    ):
+        # `author_id` holds exactly what DRF renders for the related pk.
+        attname = model_field.attname
+        return lambda instance, current_timezone: getattr(instance, attname)
+
+    if model_field is not None and _is_default(
+        field, serializers.Field, "get_attribute"
+    ):
+        attname = model_field.attname
+        convert = None
+        with_timezone = False
+        if isinstance(field, serializers.CharField) and _is_default(
+            field, serializers.CharField
+        ):
+            convert = str
+        elif isinstance(field, serializers.IntegerField) and _is_default(
+            field, serializers.IntegerField
+        ):
+            convert = int
+        elif (
+            isinstance(field, serializers.DateTimeField)
+            and _is_default(field, serializers.DateTimeField)
+            and str(getattr(field, "format", api_settings.DATETIME_FORMAT)).lower()
+            == ISO_8601
+        ):
+            convert = _datetime_to_representation(field)
+            with_timezone = True
+
+        if with_timezone:
+
+            def read_with_timezone(instance, current_timezone):
+                value = getattr(instance, attname)
+                return None if value is None else convert(value, current_timezone)
+
+            return read_with_timezone
+
+        if convert is not None:
+
+            def read(instance, current_timezone):
+                value = getattr(instance, attname)
+                return None if value is None else convert(value)
+
+            return read
+
+    if (
+        isinstance(field, ManyRelatedField)
+        and _is_default(field, ManyRelatedField)
+        and _is_default(field, ManyRelatedField, "get_attribute")
+        and isinstance(field.child_relation, PrimaryKeyRelatedField)
+        and _is_default(field.child_relation, PrimaryKeyRelatedField)
+        and field.child_relation.pk_field is None
+        and len(field.source_attrs) == 1
+    ):
+        name = field.source_attrs[0]
+
+        def read_pks(instance, current_timezone):
+            # Prefetched rows are read from the cache, building the related
+            # manager and its queryset costs more than rendering the pks.
+            cache = getattr(instance, "_prefetched_objects_cache", None)
+            if cache is not None and name in cache:
+                return [obj.pk for obj in cache[name]]
+            return [obj.pk for obj in getattr(instance, name).all()]
+
+        return read_pks
+
+    if isinstance(field, serializers.ModelSerializer) and _is_default(
+        field, serializers.Serializer
+    ):
+        represent = compile_serializer(field)
+
+        def read_nested(instance, current_timezone):
+            attribute = field.get_attribute(instance)
+            if attribute is None:
+                return None
+            return represent(attribute, current_timezone)
+
+        return read_nested
+
+    # Same steps as `Serializer.to_representation` for a single field.
+    def read_generic(instance, current_timezone):
+        attribute = field.get_attribute(instance)
+        check_for_none = (
+            attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        )
+        if check_for_none is None:
+            return None
+        return field.to_representation(attribute)
+
+    return read_generic
+
+
+def compile_serializer(serializer, fields=None):
+    """
+    Inspects a read only serializer once and returns a function turning an
+    instance into the same dict `serializer.to_representation` would produce.
+    Serializers overriding `to_representation` keep using it. The function takes
+    an optional `representation_timezone()`, looked up when not given.
+    :param fields: Only represent these fields
+    """
+    if not _is_default(serializer, serializers.Serializer):
+
+        def represent_custom(instance, current_timezone=None):
+            data = serializer.to_representation(instance)
+            if fields is None:
+                return data
+            return {name: value for name, value in data.items() if name in fields}
+
+        return represent_custom
+
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    readers = [
+        (name, _compile_field(field, model))
+        for name, field in serializer.fields.items()
+        if not field.write_only and (fields is None or name in fields)
+    ]
+
+    def represent(instance, current_timezone=_LOOKUP):
+        if current_timezone is _LOOKUP:
+            current_timezone = representation_timezone()
+        ret = {}
+        for name, read in readers:
+            try:
+                ret[name] = read(instance, current_timezone)
+            except SkipField:
+                pass
+        return ret
+
+    return represent
+
+
+class CompiledRepresentationMixin:
+    """
+    Adds `Serializer.represent_many(instances)`, a read only fast path producing
+    the same output as `Serializer(instances, many=True).data`.
+    """
+
+    @classmethod
+    def compiled_representation(cls, fields=None):
+        if "_compiled_representations" not in cls.__dict__:
+            cls._compiled_representations = {}
+        key = tuple(fields) if fields is not None else None
+        if key not in cls._compiled_representations:
+            cls._compiled_representations[key] = compile_serializer(cls(), key)
+        return cls._compiled_representations[key]
+
+    @classmethod
+    def represent_many(cls, instances, fields=None):
+        represent = cls.compiled_representation(fields)
+        current_timezone = representation_timezone()
+        return [represent(instance, current_timezone) for instance in instances]
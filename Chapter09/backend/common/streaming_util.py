@@ -0,0 +1,80 @@
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from common.serializer_util import representation_timezone
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def iter_serialized(
+    queryset, serializer_class, chunk_size=DEFAULT_CHUNK_SIZE, fields=None
+):
+    """
+    Yields serialized rows one at a time, only `chunk_size` model instances are
+    held in memory at any point.
+    """
+    if hasattr(serializer_class, "compiled_representation"):
+        represent = serializer_class.compiled_representation(fields)
+        current_timezone = representation_timezone()
+    else:
+
+        def represent(instance, current_timezone):
+            return serializer_class(instance).data
+
+        current_timezone = None
+
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        yield represent(instance, current_timezone)
+        # Prefetched querysets refer back to the instance, the reference cycle
+        # would keep every streamed row alive until the next gc collection.
+        instance.__dict__.pop("_prefetched_objects_cache", None)
+
+
+def iter_json_array(rows, key=None):
+    """
+    Yields the pieces of a valid JSON document built from `rows`, either a plain
+    array or an object with the array under `key`.
+    """
+    encoder = JSONEncoder()
+    yield '{"%s": [' % key if key else "["
+    separator = ""
+    for row in rows:
+        yield separator + encoder.encode(row)
+        separator = ","
+    yield "]}" if key else "]"
+
+
+def iter_ndjson(rows):
+    """Yields one JSON document per line for each row."""
+    encoder = JSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def streaming_json_response(
+    queryset,
+    serializer_class,
+    key=None,
+    ndjson=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    fields=None,
+):
+    """
+    :param queryset: Queryset to stream, it is read with `QuerySet.iterator`
+    :param serializer_class: Serializer used for every single row
+    :param key: Wrap the array in an object under this key, ignored for NDJSON
+    :param ndjson: Stream newline delimited JSON instead of a JSON array
+    :param chunk_size: Number of rows fetched from the database per round trip
+    :param fields: Only serialize these fields, requires a serializer using
+        `CompiledRepresentationMixin`
+    """
+    rows = iter_serialized(
+        queryset, serializer_class, chunk_size=chunk_size, fields=fields
+    )
+    if ndjson:
+        return StreamingHttpResponse(
+            iter_ndjson(rows), content_type="application/x-ndjson"
+        )
+    return StreamingHttpResponse(
+        iter_json_array(rows, key=key), content_type="application/json"
+    )
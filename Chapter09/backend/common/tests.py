@@ -0,0 +1,820 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from unittest import mock
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.auth.models import Permission
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import force_authenticate
+
+from cacheops.signals import cache_invalidated
+
+from author.models import Author
+from blog import views
+from blog.tests import create_blogs
+from blog.models import Blog
+from blog.models import CoverImage
+from common import access_tokens
+from common import authentication
+from common import cache_util
+from common import logging_util
+from common import query_middleware
+from common import throttling
+from common.query_middleware import QueryBudgetExceeded
+from common.query_middleware import QueryInspectMiddleware
+from common.db import metrics
+from common.db import router
+from common.db.router import PIN_COOKIE
+from common.db.router import ReplicaLagMonitor
+from common.db.router import ReplicaPinMiddleware
+from common.query_middleware import normalize_sql
+from common.access_tokens import RevocationList
+from common.access_tokens import issue_access_token
+from common.access_tokens import user_from_access_token
+from common.authentication import CachedTokenAuthentication
+from common.cache_util import two_tier_cached
+from common.permission_util import get_user_access
+from common.permission_util import has_group
+from common.permission_util import has_perm
+from common.logging_util import LogBatchWriter
+from common.logging_util import log_event
+from common.localthread_middleware import PopulateLocalsThreadMiddleware
+from common.localthread_middleware import get_current_request
+from common.localthread_middleware import get_txid
+from common.localthread_middleware import reset_request_context
+from common.localthread_middleware import set_request_context
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        author = Author.objects.create(name="Author", email="author@example.com")
+        for i in range(3):
+            Blog.objects.create(
+                title=f"blog-{i}",
+                content="Django in production",
+                author=author,
+                cover_image=CoverImage.objects.create(
+                    image_link=f"https://example.com/{i}.png"
+                ),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_view_within_budget(self):
+        response = self.client.get("/blog/paginated/?page=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["blogs"]), 3)
+
+    def test_exceeding_the_budget_raises_when_strict(self):
+        with mock.patch.object(views.get_blog_with_pagination, "query_budget", 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/blog/paginated/?page=1")
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_exceeding_the_budget_is_logged(self):
+        with mock.patch.object(
+            views.get_blog_with_pagination, "query_budget", 1
+        ), mock.patch.object(query_middleware, "log_event") as log_event:
+            response = self.client.get("/blog/paginated/?page=1")
+        self.assertEqual(response.status_code, 200)
+        event, data = log_event.call_args.args
+        self.assertEqual(event, "query_budget_exceeded")
+        self.assertEqual(data["budget"], 1)
+        self.assertGreater(data["count"], 1)
+
+    @override_settings(QUERY_REPEAT_THRESHOLD=1)
+    async def test_async_view_queries_are_recorded(self):
+        token = await Token.objects.acreate(user=self.user)
+        with mock.patch.object(query_middleware, "log_event") as log_event:
+            response = await self.async_client.get(
+                "/blog/async/paginated/?page=1",
+                headers={"Authorization": f"Token {token.key}"},
+            )
+        self.assertEqual(response.status_code, 200)
+        event, data = log_event.call_args.args
+        self.assertEqual(event, "n_plus_one_detected")
+        self.assertTrue(
+            any('FROM "blog_blog"' in query["sql"] for query in data["queries"])
+        )
+
+    @override_settings(QUERY_REPEAT_THRESHOLD=1)
+    async def test_queries_of_other_threads_are_recorded(self):
+        # Under ASGI the async ORM runs on the connections of other threads.
+        def query():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            finally:
+                connection.close()
+
+        async def get_response(request):
+            await sync_to_async(query, thread_sensitive=False)()
+            return HttpResponse()
+
+        middleware = QueryInspectMiddleware(get_response)
+        with mock.patch.object(query_middleware, "log_event") as log_event:
+            await middleware(RequestFactory().get("/"))
+        event, data = log_event.call_args.args
+        self.assertEqual(event, "n_plus_one_detected")
+        self.assertEqual(data["queries"][0]["sql"], "SELECT ?")
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'a'"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s) AND name = 'b'"),
+        )
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTest(TransactionTestCase):
+    # "replica" mirrors "default" in tests, both aliases see the same data.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Author", email="author@example.com")
+
+    def request(self, view, **cookies):
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies)
+        self.used = None
+
+        def get_response(request):
+            self.used = view()
+            return HttpResponse()
+
+        return ReplicaPinMiddleware(get_response)(request)
+
+    def read(self):
+        author = Author.objects.get(id=self.author.id)
+        return author._state.db
+
+    def write_then_read(self):
+        Author.objects.create(name="Other", email="other@example.com")
+        return self.read()
+
+    def test_reads_go_to_the_replica(self):
+        response = self.request(self.read)
+        self.assertEqual(self.used, "replica")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.read(), "default")
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        def read_in_transaction():
+            with transaction.atomic():
+                return self.read()
+
+        self.request(read_in_transaction)
+        self.assertEqual(self.used, "default")
+
+    def test_write_pins_the_request_and_the_client(self):
+        response = self.request(self.write_then_read)
+        self.assertEqual(self.used, "default")
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], 5)
+        self.assertGreater(float(cookie.value), time.time())
+
+        # The next request of the client sends the cookie back.
+        self.request(self.read, **{PIN_COOKIE: cookie.value})
+        self.assertEqual(self.used, "default")
+
+    def test_expired_pin_reads_from_the_replica(self):
+        self.request(self.read, **{PIN_COOKIE: str(time.time() - 1)})
+        self.assertEqual(self.used, "replica")
+
+    def test_views_which_write_pin_the_client(self):
+        self.client.force_login(User.objects.create_user("reader"))
+        response = self.client.get("/blog/publish/?blog_id=1&author_id=1")
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get("/blog/paginated/?page=1")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_one_replica_per_request(self):
+        def read_twice():
+            self.read()
+            return self.read()
+
+        with mock.patch.object(
+            router.random, "choice", side_effect=lambda aliases: aliases[0]
+        ) as choice:
+            self.request(read_twice)
+        self.assertEqual(self.used, "replica")
+        self.assertEqual(choice.call_count, 1)
+
+    def test_related_rows_follow_the_instance(self):
+        def read_blog_author():
+            blog = Blog.objects.get()
+            # Read after the middleware returned, like a streamed response.
+            return lambda: blog.author._state.db
+
+        create_blogs(self.author, 1)
+        self.request(read_blog_author)
+        self.assertEqual(self.used(), "replica")
+
+    def test_streamed_rows_are_read_from_the_replica(self):
+        create_blogs(self.author, 3)
+        self.client.force_login(User.objects.create_user("reader"))
+        response = self.client.get("/blog/unpaginated/?stream=ndjson&fields=id")
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(
+            any('FROM "blog_blog"' in query["sql"] for query in replica_queries)
+        )
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch.object(router.lag_monitor, "lag", return_value=60):
+            self.request(self.read)
+        self.assertEqual(self.used, "default")
+
+
+class ReplicaLagMonitorTest(TestCase):
+    def test_lag_is_measured_once_per_interval(self):
+        monitor = ReplicaLagMonitor()
+        with mock.patch.object(monitor, "measure", return_value=2) as measure:
+            self.assertEqual(monitor.lag("replica"), 2)
+            self.assertEqual(monitor.lag("replica"), 2)
+            with override_settings(REPLICA_LAG_CHECK_INTERVAL=0):
+                monitor.lag("replica")
+        self.assertEqual(measure.call_count, 2)
+
+
+class FakeRedis:
+    """Delivers published messages to the subscribers of this process."""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def pubsub(self, **kwargs):
+        return self
+
+    def subscribe(self, **handlers):
+        self.handlers.update(handlers)
+
+    def run_in_thread(self, **kwargs):
+        return object()
+
+    def publish(self, channel, message):
+        if channel in self.handlers:
+            self.handlers[channel]({"data": message.encode()})
+
+
+@override_settings(L1_CACHE_ENABLED=True)
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        for patcher in [
+            mock.patch.object(cache_util, "redis_client", self.redis),
+            mock.patch.object(cache_util, "_listener_thread", None),
+            mock.patch.dict(cache_util._caches_by_model, clear=True),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = []
+
+        @two_tier_cached(depends_on=[Blog], local_timeout=60)
+        def count_blogs(author_id):
+            self.calls.append(author_id)
+            return Blog.objects.filter(author_id=author_id).count()
+
+        self.count_blogs = count_blogs
+
+    def test_results_are_served_from_process_memory(self):
+        self.assertEqual(self.count_blogs(1), 0)
+        self.assertEqual(self.count_blogs(1), 0)
+        self.count_blogs(2)
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual(self.count_blogs.stats()["l1_hits"], 1)
+        self.assertNotEqual(self.count_blogs.key(1), self.count_blogs.key(2))
+
+    def test_invalidation_is_published_to_every_worker(self):
+        self.count_blogs(1)
+        # Another worker saved a blog, cacheops signals the invalidation.
+        cache_invalidated.send(sender=Blog, obj_dict={"author_id": 1})
+        self.count_blogs(1)
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_invalidate_all_flushes_every_local_cache(self):
+        self.count_blogs(1)
+        cache_invalidated.send(sender=None, obj_dict=None)
+        self.count_blogs(1)
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_other_models_do_not_flush(self):
+        self.count_blogs(1)
+        cache_invalidated.send(sender=Author, obj_dict={"id": 1})
+        self.count_blogs(1)
+        self.assertEqual(self.calls, [1])
+
+    def test_entries_expire(self):
+        now = time.monotonic()
+        with mock.patch.object(cache_util.time, "monotonic", return_value=now):
+            self.count_blogs(1)
+        with mock.patch.object(cache_util.time, "monotonic", return_value=now + 61):
+            self.count_blogs(1)
+        self.assertEqual(self.calls, [1, 1])
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+class LogBatchWriterTest(TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("common.tests.batch")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.handlers.clear)
+        self.writer = LogBatchWriter(queue.Queue(), batch_size=10, flush_interval=0)
+
+    def add_handler(self, handler):
+        handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        self.logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def entry(self, event, level=logging.INFO):
+        return (time.time(), 1, self.logger, level, {"ev": event})
+
+    def test_batch_is_written_and_flushed_once(self):
+        stream = CountingStream()
+        self.add_handler(logging.StreamHandler(stream))
+        self.writer.write([self.entry(f"event-{i}") for i in range(3)])
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(
+            [json.loads(line.split(" ", 1)[1])["ev"] for line in lines],
+            ["event-0", "event-1", "event-2"],
+        )
+        self.assertEqual((stream.writes, stream.flushes), (1, 1))
+
+    def test_handler_level_is_applied(self):
+        stream = io.StringIO()
+        self.add_handler(logging.StreamHandler(stream)).setLevel(logging.WARNING)
+        self.writer.write([self.entry("info"), self.entry("warning", logging.WARNING)])
+        (line,) = stream.getvalue().splitlines()
+        self.assertTrue(line.startswith("WARNING "))
+
+    def test_rotating_file_rolls_over(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        filename = os.path.join(directory.name, "events.log")
+        self.add_handler(RotatingFileHandler(filename, maxBytes=200, backupCount=1))
+        for i in range(4):
+            self.writer.write([self.entry("x" * 30) for _ in range(2)])
+        self.assertTrue(os.path.exists(filename + ".1"))
+        self.assertLess(os.path.getsize(filename), 200)
+
+    def test_failed_writes_are_counted(self):
+        handler = self.add_handler(logging.StreamHandler(io.StringIO()))
+        with mock.patch.object(handler, "format", side_effect=ValueError), mock.patch(
+            "sys.stderr", io.StringIO()
+        ):
+            self.writer.write([self.entry("a"), self.entry("b")])
+        self.assertEqual(self.writer.failed, 2)
+
+    def test_log_data_is_copied_when_queued(self):
+        with mock.patch.object(
+            logging_util, "get_log_writer", return_value=self.writer
+        ):
+            data = {"count": 1}
+            log_event("event", data, logging_module=self.logger.name)
+            data["count"] = 2
+        *_, msg = self.writer.queue.get_nowait()
+        self.assertEqual(msg["data"], {"count": 1})
+
+
+class RequestContextTest(TestCase):
+    def test_isolated_between_threads(self):
+        barrier = threading.Barrier(2)
+        seen = {}
+
+        def work(txid):
+            tokens = set_request_context(txid=txid)
+            # Both threads have set their context before either reads it.
+            barrier.wait()
+            seen[txid] = get_txid()
+            reset_request_context(tokens)
+
+        threads = [threading.Thread(target=work, args=(t,)) for t in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(seen, {"a": "a", "b": "b"})
+        self.assertIsNone(get_txid())
+
+    def test_isolated_between_asyncio_tasks(self):
+        async def work(txid):
+            tokens = set_request_context(txid=txid)
+            await asyncio.sleep(0)
+            try:
+                return get_txid()
+            finally:
+                reset_request_context(tokens)
+
+        async def main():
+            return await asyncio.gather(work("a"), work("b"))
+
+        self.assertEqual(asyncio.run(main()), ["a", "b"])
+
+    def test_middleware_populates_and_resets_the_context(self):
+        seen = []
+
+        def get_response(request):
+            seen.append((get_current_request(), get_txid()))
+            return HttpResponse()
+
+        middleware = PopulateLocalsThreadMiddleware(get_response)
+        first, second = RequestFactory().get("/"), RequestFactory().get("/")
+        middleware(first)
+        middleware(second)
+        self.assertEqual([request for request, _ in seen], [first, second])
+        self.assertNotEqual(seen[0][1], seen[1][1])
+        self.assertIsNone(get_current_request())
+
+    def test_views_log_with_the_request_txid(self):
+        txids = []
+        self.client.force_login(User.objects.create_user("reader"))
+        with mock.patch.object(
+            views, "log_event", side_effect=lambda *args: txids.append(get_txid())
+        ):
+            self.client.get("/blog/find-by-author/?author_id=1")
+        self.assertEqual(len(set(txids)), 1)
+        self.assertIsNotNone(txids[0])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_request_context", number=10, repeat=1, stdout=out)
+        self.assertIn("context set/reset", out.getvalue())
+
+
+@override_settings(ACCESS_TOKENS_ENABLED=True)
+class AccessTokenTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader", is_staff=True)
+        cls.user.groups.add(Group.objects.create(name="editors"))
+
+    def setUp(self):
+        # Access versions live in the cache.
+        cache.clear()
+        # Revocations are stored in a Redis hash, kept in a dict here.
+        self.stored = {}
+        self.redis = mock.MagicMock()
+        self.redis.hgetall.side_effect = lambda key: dict(self.stored)
+        self.redis.zrangebyscore.return_value = []
+
+        def hset(key, field, value):
+            self.stored[field.encode()] = value.encode()
+
+        self.redis.pipeline.return_value.hset.side_effect = hset
+        for patcher in [
+            mock.patch.object(access_tokens, "redis_client", self.redis),
+            mock.patch.object(access_tokens, "revocations", RevocationList()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, token):
+        return self.client.get(
+            "/blog/paginated/", HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+
+    def test_token_carries_the_user(self):
+        user = user_from_access_token(issue_access_token(self.user))
+        self.assertEqual((user.id, user.username), (self.user.id, "reader"))
+        self.assertTrue(user.is_staff)
+        self.assertFalse(user.is_superuser)
+        self.assertEqual(user.token_groups, {"editors"})
+        self.assertEqual(self.get(issue_access_token(self.user)).status_code, 200)
+
+    def test_token_user_is_read_only(self):
+        user = user_from_access_token(issue_access_token(self.user))
+        with self.assertRaises(NotImplementedError):
+            user.save()
+        with self.assertRaises(NotImplementedError):
+            user.delete()
+
+    def test_tampered_token_is_rejected(self):
+        token = issue_access_token(self.user)
+        self.assertIsNone(user_from_access_token(token[:-2]))
+        self.assertEqual(self.get(token[:-2]).status_code, 401)
+
+    def test_expired_token_is_rejected(self):
+        token = issue_access_token(self.user)
+        expired = time.time() + 301
+        with mock.patch("django.core.signing.time.time", return_value=expired):
+            self.assertIsNone(user_from_access_token(token))
+
+    def test_access_change_revokes_issued_tokens(self):
+        token = issue_access_token(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.clear()
+        self.assertIsNone(user_from_access_token(token))
+        self.assertIn(str(self.user.id).encode(), self.stored)
+        # Tokens issued after the change are accepted.
+        self.assertIsNotNone(user_from_access_token(issue_access_token(self.user)))
+
+    def test_logout_revokes_issued_tokens(self):
+        token = issue_access_token(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            # The token is the refresh token of the access tokens.
+            Token.objects.create(user=self.user).delete()
+        self.assertIsNone(user_from_access_token(token))
+
+    def test_revocations_of_other_workers_are_loaded(self):
+        token = issue_access_token(self.user)
+        version = access_tokens.get_access_versions(self.user.id)[1]
+        self.stored[str(self.user.id).encode()] = f"{version + 1}:0".encode()
+        self.assertIsNone(user_from_access_token(token))
+
+    @override_settings(ACCESS_TOKENS_ENABLED=False)
+    def test_disabled(self):
+        self.assertIsNone(user_from_access_token(issue_access_token(self.user)))
+
+
+class FakeGCRAScript:
+    """Same steps as GCRA_SCRIPT, on a dict and a clock set by the test."""
+
+    def __init__(self):
+        self.store = {}
+        self.now = 1_000_000
+        self.calls = []
+        self.error = None
+
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        if self.error is not None:
+            raise self.error
+        emission_interval, burst = args
+        burst_offset = emission_interval * burst
+        tat = self.store.get(keys[0])
+        if tat is None or tat < self.now:
+            tat = self.now
+        new_tat = tat + emission_interval
+        allow_at = new_tat - burst_offset
+        if self.now < allow_at:
+            return [0, allow_at - self.now]
+        self.store[keys[0]] = new_tat
+        return [1, 0]
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"blog_limit": "10/min"},
+    }
+)
+class GCRAThrottleTest(TestCase):
+    def setUp(self):
+        self.script = FakeGCRAScript()
+        patcher = mock.patch.object(
+            throttling, "get_gcra_script", return_value=self.script
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.view = views.Blog2ApiView.as_view()
+        self.user = User.objects.create_user("reader")
+
+    def get(self, user=None):
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=user or self.user)
+        return self.view(request)
+
+    def test_burst_then_one_request_per_interval(self):
+        statuses = [self.get().status_code for _ in range(11)]
+        self.assertEqual(statuses, [200] * 10 + [429])
+        # 10/min is one request every 6 seconds.
+        self.assertEqual(self.script.calls[0][1], [6000, 10])
+        self.assertEqual(self.get()["Retry-After"], "6")
+
+        self.script.now += 5000
+        self.assertEqual(self.get()["Retry-After"], "1")
+        self.script.now += 1000
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get().status_code, 429)
+
+    def test_clients_are_limited_separately(self):
+        for _ in range(10):
+            self.get()
+        self.assertEqual(self.get().status_code, 429)
+        other = User.objects.create_user("other")
+        self.assertEqual(self.get(other).status_code, 200)
+
+    def test_idle_client_gets_a_full_burst_back(self):
+        for _ in range(10):
+            self.get()
+        self.script.now += 60_000
+        statuses = [self.get().status_code for _ in range(11)]
+        self.assertEqual(statuses, [200] * 10 + [429])
+
+    def test_fails_open_when_redis_is_down(self):
+        self.script.error = redis.ConnectionError("Connection refused")
+        for _ in range(20):
+            self.assertEqual(self.get().status_code, 200)
+
+
+class PermissionCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("editor")
+        cls.group = Group.objects.create(name="editors")
+        cls.permission = Permission.objects.get(codename="update_title")
+
+    def setUp(self):
+        # Cached access and versions live in the cache.
+        cache.clear()
+
+    def fresh_user(self):
+        # A new request loads a new user object.
+        return User.objects.get(id=self.user.id)
+
+    def change(self, func, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args)
+
+    def test_access_is_cached(self):
+        get_user_access(self.fresh_user())
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(has_group(user, "editors"))
+            self.assertFalse(has_perm(user, "blog.update_title"))
+
+    def test_user_added_to_a_group(self):
+        self.assertFalse(has_group(self.user, "editors"))
+        self.change(self.user.groups.add, self.group)
+        # The user object of the request is refreshed too.
+        self.assertTrue(has_group(self.user, "editors"))
+        self.assertTrue(has_group(self.fresh_user(), "editors"))
+
+    def test_group_given_a_user(self):
+        self.assertFalse(has_group(self.fresh_user(), "editors"))
+        self.change(self.group.user_set.add, self.user)
+        self.assertTrue(has_group(self.fresh_user(), "editors"))
+
+    def test_group_given_a_permission(self):
+        self.change(self.user.groups.add, self.group)
+        self.assertFalse(has_perm(self.fresh_user(), "blog.update_title"))
+        self.change(self.group.permissions.add, self.permission)
+        self.assertTrue(has_perm(self.fresh_user(), "blog.update_title"))
+        self.assertTrue(self.fresh_user().has_perm("blog.update_title"))
+
+    def test_user_given_a_permission(self):
+        self.assertFalse(has_perm(self.fresh_user(), "blog.update_title"))
+        self.change(self.user.user_permissions.add, self.permission)
+        self.assertTrue(has_perm(self.fresh_user(), "blog.update_title"))
+
+    def test_group_deleted(self):
+        self.change(self.user.groups.add, self.group)
+        self.assertTrue(has_group(self.fresh_user(), "editors"))
+        self.change(self.group.delete)
+        self.assertFalse(has_group(self.fresh_user(), "editors"))
+
+    def test_not_invalidated_before_commit(self):
+        self.assertFalse(has_group(self.fresh_user(), "editors"))
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.groups.add(self.group)
+        # Still the cached access, until the transaction commits.
+        self.assertFalse(has_group(self.fresh_user(), "editors"))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(has_group(self.fresh_user(), "editors"))
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.auth = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.auth.authenticate_credentials(self.token.key)
+
+    def test_token_is_cached(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual((user.id, token.key), (self.user.id, self.token.key))
+
+    def test_deleted_token_is_revoked(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            Token.objects.get(key=self.token.key).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivated_user_is_revoked(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    @override_settings(TOKEN_AUTH_LOCAL_TIMEOUT=30)
+    def test_falls_back_when_redis_is_down(self):
+        error = redis.ConnectionError("Connection refused")
+        with mock.patch.object(
+            authentication, "ensure_invalidation_listener", side_effect=error
+        ), mock.patch.object(
+            authentication.cache, "get", side_effect=error
+        ), mock.patch.object(
+            authentication, "log_event"
+        ) as log_event:
+            user, _ = self.authenticate()
+            self.assertEqual(user.id, self.user.id)
+            # Nothing was kept in process without the invalidation listener.
+            self.assertEqual(
+                authentication._local_cache.get(self.token.key), (False, None)
+            )
+        self.assertEqual(log_event.call_args.args[0], "token_cache_unavailable")
+
+
+class ConnectionMetricsTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(metrics._stats, dict.fromkeys(metrics._stats, 0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connections(self):
+        metrics.record_connect(0.010)
+        metrics.record_connect(0.030)
+        metrics.record_close()
+        stats = metrics.get_connection_stats()
+        self.assertEqual((stats["open"], stats["opened"]), (1, 2))
+        self.assertEqual((stats["avg_connect_ms"], stats["max_connect_ms"]), (20, 30))
+
+    def test_requests(self):
+        metrics.record_connect(0.010)
+        self.client.get("/blog/paginated/")
+        self.client.get("/blog/paginated/")
+        stats = metrics.get_connection_stats()
+        # The test connection stays open, both requests reused it.
+        self.assertEqual(stats["reuse_ratio"], 1)
+        self.assertEqual((stats["in_flight"], stats["utilization"]), (0, 0))
+        self.assertEqual(metrics._stats["requests"], 2)
+
+    def test_utilization(self):
+        metrics.record_connect(0.010)
+        metrics.record_connect(0.010)
+        request_started.send(sender=None)
+        self.assertEqual(metrics.get_connection_stats()["utilization"], 0.5)
+        with mock.patch.object(metrics, "log_event"):
+            request_finished.send(sender=None)
+        self.assertEqual(metrics.get_connection_stats()["utilization"], 0)
+
+    @override_settings(DB_METRICS_LOG_INTERVAL=60)
+    def test_logged_every_interval(self):
+        with mock.patch.object(metrics, "log_event") as log_event:
+            with mock.patch.object(metrics, "_last_logged", time.monotonic() - 61):
+                request_started.send(sender=None)
+                request_finished.send(sender=None)
+                request_started.send(sender=None)
+                request_finished.send(sender=None)
+        log_event.assert_called_once()
+        self.assertEqual(log_event.call_args.args[0], "db_connection_stats")
@@ -0,0 +1,107 @@
+"""
+Drop-in replacements for the DRF cache throttles backed by one atomic Redis
+script implementing GCRA (generic cell rate algorithm). Each client costs a
+single integer key in Redis, whatever the rate, and concurrent workers can not
+race each other.
+"""
+
+import math
+
+import redis
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import AnonRateThrottle
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.throttling import UserRateThrottle
+
+# KEYS[1]: throttle key, ARGV[1]: emission interval in ms, ARGV[2]: burst size.
+# Stores the theoretical arrival time (TAT) of the next request in ms and returns
+# {allowed, milliseconds to wait}.
+GCRA_SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local burst_offset = emission_interval * tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local tat = tonumber(redis.call("GET", KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+local new_tat = tat + emission_interval
+local allow_at = new_tat - burst_offset
+if now < allow_at then
+    return {0, allow_at - now}
+end
+redis.call("SET", KEYS[1], new_tat, "PX", new_tat - now)
+return {1, 0}
+"""
+
+_redis_client = None
+_gcra_script = None
+
+
+def get_gcra_script():
+    global _redis_client, _gcra_script
+    if _gcra_script is None:
+        url = getattr(settings, "THROTTLE_REDIS_URL", None)
+        if url is None:
+            url = settings.CACHES["default"].get("LOCATION")
+        if not url:
+            raise ImproperlyConfigured(
+                "Set THROTTLE_REDIS_URL, the default cache has no Redis LOCATION."
+            )
+        _redis_client = redis.Redis.from_url(url, socket_timeout=0.1)
+        _gcra_script = _redis_client.register_script(GCRA_SCRIPT)
+    return _gcra_script
+
+
+class GCRAThrottleMixin:
+    """
+    Replaces the timestamp history of `SimpleRateThrottle` with GCRA, allowing
+    `num_requests` per `duration` with bursts of up to `num_requests`.
+    """
+
+    cache_format = "throttle_gcra_%(scope)s_%(ident)s"
+
+    def allow_request(self, request, view):
+        self.wait_ms = 0
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        emission_interval = math.ceil(self.duration * 1000 / self.num_requests)
+        try:
+            allowed, wait_ms = get_gcra_script()(
+                keys=[self.key], args=[emission_interval, self.num_requests]
+            )
+        except redis.RedisError:
+            # Fail open, an unavailable Redis must not take the API down.
+            return True
+        self.wait_ms = wait_ms
+        return bool(allowed)
+
+    def wait(self):
+        """Seconds until the next request is allowed, sent as Retry-After."""
+        return math.ceil(self.wait_ms / 1000) if self.wait_ms else None
+
+
+class GCRAAnonRateThrottle(GCRAThrottleMixin, AnonRateThrottle):
+    pass
+
+
+class GCRAUserRateThrottle(GCRAThrottleMixin, UserRateThrottle):
+    pass
+
+
+class GCRAScopedRateThrottle(GCRAThrottleMixin, ScopedRateThrottle):
+    def allow_request(self, request, view):
+        # Same scope resolution as ScopedRateThrottle, which only knows the rate
+        # once the view is known.
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
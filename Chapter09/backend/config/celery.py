@@ -1,5 +1,9 @@
 import os
 from celery import Celery
+from celery import signals
+
+from common.localthread_middleware import reset_request_context
+from common.localthread_middleware import set_request_context
 
 celery_settings_value = "config.settings"
 
@@ -12,6 +16,35 @@ app.autodiscover_tasks()
 
 task = app.task
 
+# Request context of running tasks, keyed by task id.
+_task_contexts = {}
+
+
+@signals.task_prerun.connect
+def populate_task_context(task_id=None, **kwargs):
+    # The task id is used as txid so task logs can be correlated.
+    _task_contexts[task_id] = set_request_context(txid=task_id)
+
+
+@signals.task_postrun.connect
+def clear_task_context(task_id=None, **kwargs):
+    tokens = _task_contexts.pop(task_id, None)
+    if tokens:
+        reset_request_context(tokens)
+
+
+@signals.worker_init.connect
+def configure_worker_connections(**kwargs):
+    # Runs before the pool processes are forked, they inherit the settings.
+    from django.conf import settings
+    from django.db import connections
+
+    for alias in connections:
+        connections.settings[alias]["CONN_MAX_AGE"] = getattr(
+            settings, "CELERY_DB_CONN_MAX_AGE", 60 * 10
+        )
+    connections.close_all()
+
 
 @app.task(bind=True)
 def debug_task(self, data):
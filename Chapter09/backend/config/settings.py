@@ -37,6 +37,7 @@ DJANGO_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 CUSTOM_APPS = ["blog", "author", "user", "common"]
@@ -47,14 +48,15 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + CUSTOM_APPS
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "common.db.router.ReplicaPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    # "common.localthread_middleware.PopulateLocalsThreadMiddleware",
-    "common.custom_middleware.CustomMiddleware",
+    "common.localthread_middleware.PopulateLocalsThreadMiddleware",
+    "common.query_middleware.QueryInspectMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -88,17 +90,53 @@ WSGI_APPLICATION = "config.wsgi.application"
 #     }
 # }
 
+# Every thread of every web worker keeps one persistent connection, so web
+# workers x threads + Celery concurrency must stay under Postgres
+# max_connections, put PgBouncer in front beyond that. Under ASGI set
+# DB_CONN_MAX_AGE=0, async requests do not reuse connections.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # Django's Postgres backend recording connection metrics, see common.db
+        "ENGINE": "common.db.postgresql",
         "NAME": "django-in-production",
         "USER": "postgres",
         "PASSWORD": "admin12345",
         "HOST": "localhost",
         "PORT": 5432,
+        # Connection lifetime in seconds before it is recycled, 0 closes it
+        # after every request.
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        # Pings a reused connection once per request before using it.
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Maximum wait in seconds for a new connection.
+            "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 5)),
+            # Detects connections dropped by the network while idle.
+            "keepalives": 1,
+            "keepalives_idle": 30,
+        },
     }
 }
 
+# Celery processes run tasks one after the other and keep their connection for
+# longer, see config.celery.configure_worker_connections
+CELERY_DB_CONN_MAX_AGE = int(os.environ.get("CELERY_DB_CONN_MAX_AGE", 60 * 10))
+
+# Read replicas, see common.db.router.ReplicaRouter
+DATABASE_REPLICAS = []
+if os.environ.get("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.environ["DB_REPLICA_HOST"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append("replica")
+DATABASE_ROUTERS = ["common.db.router.ReplicaRouter"]
+# Reads of a client stay on the primary this long after it wrote.
+REPLICA_PIN_SECONDS = 5
+REPLICA_MAX_LAG_SECONDS = 10
+REPLICA_LAG_CHECK_INTERVAL = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,15 +182,26 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "common.authentication.CachedTokenAuthentication",
+        # Signed access tokens, see common.access_tokens
+        "common.access_tokens.AccessTokenAuthentication",
         # This is to support session based authentication when using the browsable API
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/min",
+        "user": "1000/min",
+        "blog_limit": "10/min",
+        "blog_2_limit": "20/min",
+    },
 }
 
+# Redis used by common.throttling, defaults to the cache Redis.
+# THROTTLE_REDIS_URL = "redis://localhost:6379/1"
+
 
 CACHES = {
     "default": {
@@ -168,6 +217,61 @@ CACHEOPS_REDIS = {
     "password": "admin12345",
 }
 
+# cached_as needs a profile for every model it caches, "ops": () keeps plain
+# querysets uncached, only the decorated functions are.
+CACHEOPS = {
+    "blog.*": {"ops": (), "timeout": 60 * 10},
+}
+
+# In-process cache in front of cacheops, see common.cache_util.two_tier_cached
+L1_CACHE_ENABLED = False
+L1_CACHE_MAX_BYTES = 1024 * 1024 * 50
+
+# Redis cache timeout of blog.async_views.get_blogs_by_author
+ASYNC_BLOG_CACHE_TIMEOUT = 60
+
+# N+1 detection and per view query budgets, see common.query_middleware
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_STRICT = False
+
+# Follower email fan-out, see blog.tasks.send_email_to_followers
+FOLLOWER_EMAIL_BATCH_SIZE = 500
+FOLLOWER_FANOUT_PAGES_PER_RUN = 100
+FOLLOWER_EMAIL_BATCHES_PER_MINUTE = 60
+
+# Local SMTP debugging server: python -m aiosmtpd -n -l localhost:1025
+EMAIL_HOST = "localhost"
+EMAIL_PORT = 1025
+DEFAULT_FROM_EMAIL = "no-reply@localhost"
+
+# Group and permission checks cached in Redis, see common.permission_util
+AUTHENTICATION_BACKENDS = ["common.permission_util.CachedPermissionBackend"]
+USER_ACCESS_CACHE_TIMEOUT = 60 * 60
+
+# Token lookups cached in process and in Redis, see common.authentication
+TOKEN_AUTH_LOCAL_TIMEOUT = 30  # 0 disables the in-process cache
+TOKEN_AUTH_LOCAL_MAX_ENTRIES = 10000
+TOKEN_AUTH_CACHE_TIMEOUT = 60 * 5
+
+# Signed access tokens issued by user.views.login, see common.access_tokens
+ACCESS_TOKENS_ENABLED = False
+ACCESS_TOKEN_TTL = 60 * 5
+ACCESS_TOKEN_REVOCATION_REFRESH = 5  # seconds
+
+# Interval in seconds of the db_connection_stats log event, see common.db.metrics
+DB_METRICS_LOG_INTERVAL = 60
+
+# Admin changelist counts, see blog.admin.CustomPaginator
+ADMIN_COUNT_STATEMENT_TIMEOUT_MS = 50
+ADMIN_COUNT_CACHE_TTL = 60 * 5
+
+# Background log writer, see common.logging_util.log_event
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 0.5  # seconds
+LOG_OVERFLOW_POLICY = "drop"  # or "sample"
+LOG_SAMPLE_RATE = 10  # keep 1 in 10 INFO events when sampling
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -0,0 +1,41 @@
+"""
+Settings of the test suite, the Postgres, Redis and Celery broker of
+config.settings are replaced by SQLite, in-memory caches and eager tasks.
+
+    python manage.py test --settings=config.settings_test
+"""
+
+from config.settings import *  # noqa: F401,F403
+from config.settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+    },
+    # Second SQLite database for the ReplicaRouter tests, it mirrors default
+    # during tests. Reads only reach it with DATABASE_REPLICAS = ["replica"].
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db-replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+DATABASE_REPLICAS = []
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+CACHEOPS_ENABLED = False
+# The in-process token cache is invalidated through Redis pub/sub.
+TOKEN_AUTH_LOCAL_TIMEOUT = 0
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BROKER_URL = "memory://"
+
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+QUERY_BUDGET_STRICT = True
+DB_METRICS_LOG_INTERVAL = 0
+PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
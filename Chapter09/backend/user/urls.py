@@ -0,0 +1,9 @@
+from django.urls import path
+
+from user import views
+
+
+urlpatterns = [
+    path("login/", views.login),
+    path("refresh/", views.refresh),
+]
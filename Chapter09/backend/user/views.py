@@ -1,18 +1,54 @@
+from django.conf import settings
 from rest_framework.authtoken.models import Token
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
 
+from common.access_tokens import get_access_token_ttl
+from common.access_tokens import issue_access_token
+
+
+def access_token_data(user):
+    return {
+        "access_token": issue_access_token(user),
+        "expires_in": get_access_token_ttl(),
+    }
+
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def login(request):
-    username = request.DATA["username"]
-    password = request.DATA["password"]
+    username = request.data["username"]
+    password = request.data["password"]
     user = authenticate(username=username, password=password)
     if not user:
         return Response(status="401")
-    token = Token.objects.get_or_create(user=user)
-    return Response(data={"token": token.key})
+    token, _ = Token.objects.get_or_create(user=user)
+    data = {"token": token.key}
+    if getattr(settings, "ACCESS_TOKENS_ENABLED", False):
+        # The token is the refresh token of the access token.
+        data.update(access_token_data(user))
+    return Response(data=data)
+
+
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def refresh(request):
+    """Returns a new access token for the `token` returned by login."""
+    if not getattr(settings, "ACCESS_TOKENS_ENABLED", False):
+        return Response(status=404)
+    token = (
+        Token.objects.select_related("user")
+        .filter(key=request.data.get("token"))
+        .first()
+    )
+    if token is None or not token.user.is_active:
+        return Response(status=401)
+    return Response(data=access_token_data(token.user))